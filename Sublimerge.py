@@ -25,13 +25,25 @@
 
 import sublime
 import sublime_plugin
+from sublimerge_core import SublimergeDiffer, SublimergeIntralineDiffer, SublimergeEqual, SublimergeHunk
 import difflib
 import re
 import os
+import stat
 import subprocess
-from xml.dom import minidom
+import threading
+import bisect
+import hashlib
+import json
+import sys
+import time
+import shlex
+import Queue
+from xml.parsers.expat import ParserCreate, ExpatError
 
 diffView = None
+diffThread = None
+gitCatFiles = {}
 
 settings = sublime.load_settings('Sublimerge.sublime-settings')
 
@@ -51,7 +63,15 @@ class SublimergeSettings():
         'selected_diff_region_scope': 'selection',
         'selected_diff_region_gutter_icon': 'bookmark',
         'ignore_whitespace': False,
+        'diff_engine': 'myers',
+        'intraline_max_length': 10000,
+        'diff_cache_memory_size': 32,
+        'diff_cache_disk_size': 0,
+        'stage_timing': False,
+        'stage_timing_trace_file': '',
+        'scroll_sync_idle_interval': 500,
         'vcs_support': True,
+        'vcs_timeout': 60,
         'git_executable_path': 'git',
         'git_log_args': '',
         'git_show_args': '',
@@ -72,136 +92,314 @@ S.load()
 settings.add_on_change('reload', lambda: S.load())
 
 
-class SublimergeDiffer():
-    def difference(self, text1, text2):
-        data = []
-        lines = list(difflib.Differ().compare(text1.splitlines(1), text2.splitlines(1)))
+class SublimergeTrace():
+    """Stage timings, on when stage_timing is set.
 
-        for i in range(len(lines)):
-            line = lines[i]
-            lastIdx = len(data) - 1
-            change = line[0]
-            line = line[2:len(line)]
+    Spans begun for an operation ('comparison', 'merge', ...) are summed up
+    by report(operation), spans of no operation only go to the trace file.
+    """
 
-            part = None
+    maxEvents = 100000
 
-            if change == '+':
-                part = {'+': line, '-': '', 'change': '+', 'intraline': '', 'intralines': {'+': [], '-': []}}
+    def __init__(self):
+        self.unwritten = []
+        self.pending = {}
+        self.path = None
+        self.written = 0
+        self.origin = time.time()
+        self.lock = threading.Lock()
 
-            elif change == '-':
-                part = {'-': line, '+': '', 'change': '-', 'intraline': '', 'intralines': {'+': [], '-': []}}
+    def begin(self, name, args=None, operation=None):
+        if not S.get('stage_timing'):
+            return None
 
-            elif change == ' ':
-                part = line
+        return (name, time.time(), args or {}, operation)
 
-            elif change == '?':
-                continue
+    def end(self, span, args=None):
+        if span == None:
+            return
+
+        now = time.time()
+        name, started, spanArgs, operation = span
+
+        if args != None:
+            spanArgs.update(args)
+
+        event = {
+            'name': name,
+            'ph': 'X',
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'ts': int((started - self.origin) * 1000000),
+            'dur': int((now - started) * 1000000),
+            'args': spanArgs
+        }
+
+        self.lock.acquire()
+
+        if operation != None:
+            self.pending.setdefault(operation, []).append(event)
+
+        self.unwritten.append(event)
+
+        if len(self.unwritten) > self.maxEvents:
+            del self.unwritten[0:len(self.unwritten) - self.maxEvents]
+
+        self.lock.release()
+
+    def report(self, operation):
+        if not S.get('stage_timing'):
+            return
+
+        self.lock.acquire()
+        pending = self.pending.pop(operation, [])
+        events = self.unwritten
+        self.unwritten = []
+        self.lock.release()
+
+        names = []
+        totals = {}
+
+        for event in pending:
+            if event['name'] not in totals:
+                names.append(event['name'])
+                totals[event['name']] = 0
+
+            totals[event['name']] += event['dur']
 
-            if isinstance(part, str) and isinstance(data[lastIdx], str):
-                data[lastIdx] += part
+        summary = 'Sublimerge %s: %s' % (operation, ', '.join(['%s %dms' % (name, totals[name] // 1000) for name in names]))
+        print summary
+        sublime.status_message(summary)
+
+        path = S.get('stage_timing_trace_file')
+
+        if path != '':
+            self.write(os.path.expanduser(path), events)
+
+    def write(self, path, events):
+        # the JSON array trace format may be left without its closing
+        # bracket, so each report only appends its new events
+        try:
+            if path != self.path:
+                f = open(path, 'w')
+                f.write('[\n')
+                self.path = path
+                self.written = 0
             else:
-                if isinstance(part, dict):
-                    if i < len(lines) - 1 and lines[i + 1][0] == '?':
-                        part['intraline'] = change
+                f = open(path, 'a')
 
-                    if lastIdx >= 0:
-                        last = data[lastIdx]
-                    else:
-                        last = None
-
-                    if isinstance(last, dict):
-                        skip = False
-
-                        im_p = last['intraline'] == '-' and part['change'] == '+'
-                        im_ip = last['intraline'] == '-' and part['intraline'] == '+'
-                        m_ip = last['change'] == '-' and part['intraline'] == '+'
-
-                        if im_p or im_ip or m_ip:
-                            data[lastIdx]['+'] += part['+']
-                            data[lastIdx]['-'] += part['-']
-                            data[lastIdx]['intraline'] = '!'
-                            skip = True
-                        elif part['intraline'] == '' and last['intraline'] == '':
-                            nextIntraline = None
-                            if i < len(lines) - 2 and lines[i + 2][0] == '?':
-                                nextIntraline = lines[i + 1][0]
-
-                            if nextIntraline == '+' and part['change'] == '-':
-                                data.append(part)
-                                skip = True
-                            else:
-                                data[lastIdx]['+'] += part['+']
-                                data[lastIdx]['-'] += part['-']
-                                skip = True
-
-                        if not skip:
-                            data.append(part)
-                    else:
-                        data.append(part)
-                else:
-                    data.append(part)
+            try:
+                for event in events:
+                    if self.written > 0:
+                        f.write(',\n')
 
-        return data
+                    f.write(json.dumps(event))
+                    self.written += 1
+            finally:
+                f.close()
+        except IOError, e:
+            print "Sublimerge: could not write trace file: %s" % (e)
+
+trace = SublimergeTrace()
 
 
 class SublimergeScrollSync():
-    left = None
-    right = None
-    scrollingView = None
-    viewToSync = None
-    lastPosLeft = None
-    lastPosRight = None
-    isRunning = False
-    last = None
-    targetPos = None
-
-    def __init__(self, left, right):
-        self.left = left
-        self.right = right
-        self.sync()
+    """Keeps both comparison views scrolled to corresponding lines.
+
+    There is no scroll event and scrolling with the mouse wheel or the
+    scrollbar fires no other event either, so the viewports are polled as
+    long as the comparison window is active - every interval ms after some
+    activity (activation, selection, edits, moving between differences) and
+    every scroll_sync_idle_interval ms once they stay still for idleTicks
+    polls. With scroll_sync_idle_interval set to 0 an idle comparison runs
+    no timers, scrolling is then followed from the next activity on. Polling
+    stops when another window gets active and starts again on activation.
+    """
+
+    interval = 100
+    idleTicks = 15
+
+    def __init__(self, view):
+        self.view = view
+        self.left = view.left
+        self.right = view.right
+        self.running = False
+        self.idle = 0
+        self.lastPosLeft = None
+        self.lastPosRight = None
+        self.wake()
+
+    def wake(self):
+        self.idle = 0
+
+        if not self.running:
+            self.running = True
+            sublime.set_timeout(self.sync, self.interval)
 
     def sync(self):
-        beginLeft = self.left.viewport_position()
-        beginRight = self.right.viewport_position()
+        active = sublime.active_window()
+
+        if self.left.window() == None or self.right.window() == None or active == None or active.id() != self.view.window.id():
+            self.running = False
+            return
+
+        posLeft = self.left.viewport_position()
+        posRight = self.right.viewport_position()
+        moved = False
+
+        if posLeft != self.lastPosLeft:
+            posRight = self.follow(self.left, self.right, 'left', posLeft)
+            moved = True
+        elif posRight != self.lastPosRight:
+            posLeft = self.follow(self.right, self.left, 'right', posRight)
+            moved = True
+
+        self.lastPosLeft = posLeft
+        self.lastPosRight = posRight
 
-        if not self.isRunning:
-            if beginLeft[0] != beginRight[0] or beginLeft[1] != beginRight[1]:
-                if self.lastPosLeft == None or (self.lastPosLeft[0] != beginLeft[0] or self.lastPosLeft[1] != beginLeft[1]):
-                    self.isRunning = True
-                    self.scrollingView = self.left
-                    self.viewToSync = self.right
+        if moved:
+            self.idle = 0
+            self.view.updateVisibleIntralines()
+        else:
+            self.idle += 1
+
+        if self.idle < self.idleTicks:
+            sublime.set_timeout(self.sync, self.interval)
+        elif S.get('scroll_sync_idle_interval') > 0:
+            sublime.set_timeout(self.sync, S.get('scroll_sync_idle_interval'))
+        else:
+            self.running = False
+
+    def lineExtent(self, view, line):
+        # wrapped lines are as tall as they are drawn
+        top = view.text_to_layout(view.text_point(line, 0))[1]
+        bottom = view.text_to_layout(view.text_point(line + 1, 0))[1]
+
+        if bottom <= top:
+            bottom = top + view.line_height()
+
+        return (top, bottom)
+
+    def follow(self, source, target, side, pos):
+        line = source.rowcol(source.layout_to_text(pos))[0]
+        top, bottom = self.lineExtent(source, line)
+        targetTop, targetBottom = self.lineExtent(target, self.view.alignedLine(side, line))
+        y = targetTop + (pos[1] - top) * (targetBottom - targetTop) / (bottom - top)
+
+        maxY = target.layout_extent()[1] - target.viewport_extent()[1]
+        targetPos = (pos[0], max(0, min(y, maxY)))
+
+        if targetPos != target.viewport_position():
+            target.set_viewport_position(targetPos, False)
+
+        return target.viewport_position()
+
+
+class SublimergeOffsets():
+    """Fenwick tree of position deltas indexed by hunk slots.
+
+    add(slot, delta) shifts every hunk with slot >= slot, prefix(slot) gives
+    the total shift of a hunk, both in O(log n).
+    """
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def size(self):
+        return len(self.tree) - 1
+
+    def add(self, slot, delta):
+        while slot < len(self.tree):
+            self.tree[slot] += delta
+            slot += slot & -slot
 
-                elif self.lastPosRight == None or (self.lastPosRight[0] != beginRight[0] or self.lastPosRight[1] != beginRight[1]):
-                    self.isRunning = True
-                    self.scrollingView = self.right
-                    self.viewToSync = self.left
+    def prefix(self, slot):
+        total = 0
 
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+
+        return total
+
+
+class SublimergeText(object):
+    """Text kept in chunks of about chunkSize characters.
+
+    splice(begin, end, contents) only rebuilds the chunks the range touches,
+    slicing and count() work as on a string.
+    """
+
+    chunkSize = 16384
+
+    def __init__(self, text=''):
+        self.chunks = self.split(text)
+        self.starts = []
+        self.length = 0
+        self.index(0)
+
+    def split(self, text):
+        return [text[i:i + self.chunkSize] for i in range(0, len(text), self.chunkSize)]
+
+    def index(self, first):
+        del self.starts[first:]
+
+        if first > 0:
+            pos = self.starts[first - 1] + len(self.chunks[first - 1])
         else:
-            pos = self.scrollingView.viewport_position()
+            pos = 0
+
+        for i in range(first, len(self.chunks)):
+            self.starts.append(pos)
+            pos += len(self.chunks[i])
+
+        self.length = pos
+
+    def find(self, position):
+        return max(bisect.bisect_right(self.starts, position) - 1, 0)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        begin, end, step = key.indices(self.length)
+
+        if end <= begin:
+            return ''
+
+        first = self.find(begin)
+        last = self.find(end - 1)
 
-            if self.targetPos == None and self.last != None and pos[0] == self.last[0] and pos[1] == self.last[1]:
-                ve = self.viewToSync.viewport_extent()
-                le = self.viewToSync.layout_extent()
+        return ''.join(self.chunks[first:last + 1])[begin - self.starts[first]:end - self.starts[first]]
 
-                self.targetPos = (max(0, min(pos[0], le[0] - ve[0])), max(0, min(pos[1], le[1] - ve[1])))
-                self.viewToSync.set_viewport_position(self.targetPos)
+    def count(self, sub, begin, end):
+        # sub is a single character, so it never spans two chunks
+        total = 0
 
-            elif self.targetPos != None:
-                poss = self.viewToSync.viewport_position()
+        if end <= begin:
+            return total
 
-                if poss[0] == self.targetPos[0] and poss[1] == self.targetPos[1]:
-                    self.isRunning = False
-                    self.targetPos = None
-                    self.scrollingView = None
-                    self.viewToSync = None
+        for i in range(self.find(begin), self.find(end - 1) + 1):
+            total += self.chunks[i].count(sub, max(begin - self.starts[i], 0), end - self.starts[i])
 
-            self.last = pos
+        return total
 
-        self.lastPosRight = beginRight
-        self.lastPosLeft = beginLeft
+    def splice(self, begin, end, contents):
+        if len(self.chunks) == 0:
+            first = last = 0
+            text = ''
+            start = 0
+        else:
+            first = self.find(begin)
+            last = self.find(end)
+            text = ''.join(self.chunks[first:last + 1])
+            start = self.starts[first]
+
+        self.chunks[first:last + 1] = self.split(text[:begin - start] + contents + text[end - start:])
+        self.index(first)
 
-        if self.left.window() != None and self.right.window() != None:
-            sublime.set_timeout(self.sync, 100)
+    def text(self):
+        return ''.join(self.chunks)
 
 
 class SublimergeView():
@@ -216,7 +414,20 @@ class SublimergeView():
     lastRightPos = None
     diff = None
     createdPositions = False
-    tmpFile = ''
+    revision = None
+    texts = None
+    editing = False
+    hunksCount = 0
+    offsets = None
+    slotSpacing = 8
+    alignment = None
+    scrollSync = None
+
+    # commands that only change text right before the cursors, mapped to the
+    # argument holding the inserted text - after these just a window around
+    # the selections is read back from the view
+    localCommands = {'insert': 'characters', 'left_delete': None, 'right_delete': None, 'delete_word': None}
+    editMargin = 256
 
     def __init__(self, window, left, right, diff):
         window.run_command('new_window')
@@ -234,10 +445,11 @@ class SublimergeView():
 
         self.left = self.window.open_file(left.file_name())
 
-        if isinstance(right, unicode):
-            self.right = self.window.open_file(right)
+        if isinstance(right, SublimergeRevision):
+            self.right = self.window.new_file()
+            self.right.set_name(right.name)
             self.right.set_syntax_file(left.settings().get('syntax'))
-            self.tmpFile = right
+            self.revision = right
         else:
             self.right = self.window.open_file(right.file_name())
             self.right.set_syntax_file(right.settings().get('syntax'))
@@ -246,6 +458,9 @@ class SublimergeView():
         self.left.set_scratch(True)
         self.right.set_scratch(True)
 
+        if self.revision != None and not self.left.is_loading():
+            sublime.set_timeout(self.loadDiff, 0)
+
     def enlargeCorrespondingPart(self, part1, part2):
         linesPlus = part1.splitlines()
         linesMinus = part2.splitlines()
@@ -262,11 +477,21 @@ class SublimergeView():
 
         result = []
 
-        result.append("\n".join(linesPlus) + "\n")
-        result.append("\n".join(linesMinus) + "\n")
+        result.append("\n".join(linesPlus) + self.finalNewline(part1))
+        result.append("\n".join(linesMinus) + self.finalNewline(part2))
+        result.append(max(0, -diffLines))
+        result.append(max(0, diffLines))
 
         return result
 
+    def finalNewline(self, part):
+        # a part not ending with a line break is the end of a file without a
+        # final newline, which is kept missing
+        if part != '' and part.splitlines(1)[-1] == part.splitlines()[-1]:
+            return ''
+
+        return "\n"
+
     def loadDiff(self):
         self.window.set_view_index(self.right, 1, 0)
         sublime.set_timeout(lambda: self.insertDiffContents(self.diff), 5)
@@ -275,300 +500,1515 @@ class SublimergeView():
         left = self.left
         right = self.right
 
-        edit = left.begin_edit()
-        left.erase(edit, sublime.Region(0, left.size()))
-        left.end_edit(edit)
+        span = trace.begin('build contents', None, 'comparison')
+        leftText, rightText, regions = self.buildContents(diff)
+        trace.end(span, {'hunks': len(regions), 'bytes': len(leftText) + len(rightText)})
+
+        self.editing = True
+
+        span = trace.begin('replace', None, 'comparison')
+
+        edit = left.begin_edit()
+        left.replace(edit, sublime.Region(0, left.size()), leftText)
+        left.end_edit(edit)
+
+        edit = right.begin_edit()
+        right.replace(edit, sublime.Region(0, right.size()), rightText)
+        right.end_edit(edit)
+
+        trace.end(span, {'bytes': len(leftText) + len(rightText)})
+
+        self.editing = False
+        self.texts = {'left': SublimergeText(leftText), 'right': SublimergeText(rightText)}
+        self.alignment = None
+
+        self.regions = regions
+
+        span = trace.begin('index regions', None, 'comparison')
+        self.indexRegions()
+        trace.end(span, {'hunks': len(regions)})
+
+        span = trace.begin('add_regions', None, 'comparison')
+
+        for pair in regions:
+            self.createDiffRegion(pair)
+
+        trace.end(span, {'hunks': len(regions)})
+
+        self.createdPositions = True
+
+        sublime.set_timeout(lambda: self.selectDiff(0), 100)  # for some reason this fixes the problem to scroll both views to proper position after loading diff
+
+        self.lockViews()
+        self.scrollSync = SublimergeScrollSync(self)
+
+        trace.report('comparison')
+
+    def buildContents(self, diff):
+        leftParts = []
+        rightParts = []
+        leftPos = 0
+        rightPos = 0
+        padding = len(S.get('diff_region_expander_text')) + 1
+
+        regions = []
+        differ = SublimergeDiffer()
+
+        for part in differ.load(diff):
+            if isinstance(part, SublimergeEqual):
+                text = part.text()
+                leftParts.append(text)
+                rightParts.append(text)
+                leftPos += len(text)
+                rightPos += len(text)
+            else:
+                minus = part.minus()
+                plus = part.plus()
+
+                if S.get('ignore_whitespace'):
+                    if differ.whitespaceOnly(part):
+                        leftParts.append(minus)
+                        rightParts.append(plus)
+                        leftPos += len(minus)
+                        rightPos += len(plus)
+                        continue
+
+                # regions are kept relative to the offsets index once the
+                # hunk gets a slot, use hunkRegion() to read them
+                pair = {
+                    'regionLeft': None,
+                    'regionRight': None,
+                    'slot': None,
+                    'name': 'diff' + str(self.hunksCount),
+                    'mergeLeft': plus,
+                    'mergeRight': minus,
+                    'intraline': plus != '' and minus != '' and part.intraline != '',
+                    'intralines': None,
+                    'paddingLeft': 0,
+                    'paddingRight': 0
+                }
+
+                self.hunksCount += 1
+
+                enlarged = self.enlargeCorrespondingPart(plus, minus)
+
+                leftStart = leftPos
+                rightStart = rightPos
+
+                leftParts.append(enlarged[1])
+                rightParts.append(enlarged[0])
+                leftPos += len(enlarged[1])
+                rightPos += len(enlarged[0])
+
+                pair['regionLeft'] = sublime.Region(leftStart, leftPos)
+                pair['regionRight'] = sublime.Region(rightStart, rightPos)
+                pair['paddingLeft'] = enlarged[3] * padding
+                pair['paddingRight'] = enlarged[2] * padding
+
+                regions.append(pair)
+
+        return (''.join(leftParts), ''.join(rightParts), regions)
+
+    def indexRegions(self):
+        for pair in self.regions:
+            if pair['slot'] != None:
+                pair['regionLeft'] = self.hunkRegion(pair, 'regionLeft')
+                pair['regionRight'] = self.hunkRegion(pair, 'regionRight')
+
+        for i in range(len(self.regions)):
+            self.regions[i]['slot'] = (i + 1) * self.slotSpacing
+
+        size = (len(self.regions) + 1) * self.slotSpacing
+        self.offsets = {'regionLeft': SublimergeOffsets(size), 'regionRight': SublimergeOffsets(size)}
+
+    def hunkRegion(self, pair, regionKey):
+        shift = self.offsets[regionKey].prefix(pair['slot'])
+        return self.moveRegionBy(pair[regionKey], shift)
+
+    def alignedLine(self, side, line):
+        if self.alignment == None:
+            self.alignment = self.buildAlignment()
+
+        if side == 'left':
+            starts, otherStarts = self.alignment
+        else:
+            otherStarts, starts = self.alignment
+
+        segment = bisect.bisect_right(starts, line) - 1
+        offset = line - starts[segment]
+
+        if segment + 1 < len(otherStarts):
+            offset = min(offset, otherStarts[segment + 1] - otherStarts[segment])
+
+        return otherStarts[segment] + offset
+
+    def buildAlignment(self):
+        # line numbers at which unchanged blocks and hunks begin, the same
+        # index refers to corresponding parts of both views
+        left = self.texts['left']
+        right = self.texts['right']
+        startsLeft = [0]
+        startsRight = [0]
+        lineLeft = lineRight = 0
+        posLeft = posRight = 0
+
+        for pair in self.regions + [None]:
+            if pair != None:
+                regionLeft = self.hunkRegion(pair, 'regionLeft')
+                regionRight = self.hunkRegion(pair, 'regionRight')
+                endLeft = regionLeft.begin()
+                endRight = regionRight.begin()
+            else:
+                endLeft = len(left)
+                endRight = len(right)
+
+            countLeft = left.count('\n', posLeft, endLeft)
+            countRight = right.count('\n', posRight, endRight)
+
+            if countLeft != countRight:
+                # whitespace differences are shown as unchanged text,
+                # so such a block has to be aligned line by line
+                for part in SublimergeDiffer().hunks(left[posLeft:endLeft], right[posRight:endRight], 'myers'):
+                    if isinstance(part, SublimergeHunk):
+                        lineLeft += part.minus().count('\n')
+                        lineRight += part.plus().count('\n')
+                    else:
+                        lineLeft += part.text().count('\n')
+                        lineRight += part.text().count('\n')
+
+                    startsLeft.append(lineLeft)
+                    startsRight.append(lineRight)
+            else:
+                lineLeft += countLeft
+                lineRight += countRight
+                startsLeft.append(lineLeft)
+                startsRight.append(lineRight)
+
+            if pair != None:
+                lineLeft += left.count('\n', regionLeft.begin(), regionLeft.end())
+                lineRight += right.count('\n', regionRight.begin(), regionRight.end())
+                startsLeft.append(lineLeft)
+                startsRight.append(lineRight)
+                posLeft = regionLeft.end()
+                posRight = regionRight.end()
+
+        return (startsLeft, startsRight)
+
+    def lockViews(self):
+        self.left.set_read_only(False)
+        self.right.set_read_only(self.revision != None)
+
+    def snapshotTexts(self):
+        self.texts = {
+            'left': SublimergeText(self.left.substr(sublime.Region(0, self.left.size()))),
+            'right': SublimergeText(self.right.substr(sublime.Region(0, self.right.size())))
+        }
+
+    def changedRange(self, old, new):
+        length = min(len(old), len(new))
+        step = 4096
+        start = 0
+
+        while start + step <= length and old[start:start + step] == new[start:start + step]:
+            start += step
+
+        while start < length and old[start] == new[start]:
+            start += 1
+
+        if start == len(old) and start == len(new):
+            return None
+
+        length -= start
+        suffix = 0
+
+        while suffix + step <= length and old[len(old) - suffix - step:len(old) - suffix] == new[len(new) - suffix - step:len(new) - suffix]:
+            suffix += step
+
+        while suffix < length and old[len(old) - suffix - 1] == new[len(new) - suffix - 1]:
+            suffix += 1
+
+        return (start, len(old) - suffix, len(new) - suffix)
+
+    def editedRange(self, view, old):
+        size = view.size()
+        delta = size - len(old)
+        command, args, repeat = view.command_history(0, True)
+        selection = list(view.sel())
+
+        if command in self.localCommands and len(selection) > 0:
+            inserted = 0
+
+            if self.localCommands[command] != None and args != None:
+                inserted = len(args.get(self.localCommands[command], '')) * max(repeat, 1)
+
+            lo = max(min([region.begin() for region in selection]) - inserted - self.editMargin, 0)
+            hi = min(max([region.end() for region in selection]) + self.editMargin, size)
+
+            if lo <= hi - delta <= len(old):
+                window = view.substr(sublime.Region(lo, hi))
+                changed = self.changedRange(old[lo:hi - delta], window)
+
+                # the edit has to end inside the window, otherwise it may
+                # go on past it
+                if changed != None and (changed[0] > 0 or lo == 0) and (changed[2] < len(window) or hi == size):
+                    return (lo + changed[0], lo + changed[1], lo + changed[2])
+
+        # undo, replace all or another plugin may have changed any part
+        return self.changedRange(old.text(), view.substr(sublime.Region(0, size)))
+
+    def realText(self, text, begin, end, hunks, regionKey, paddingKey, edit):
+        parts = []
+        pos = begin
+
+        for pair in hunks:
+            padding = pair[paddingKey]
+
+            if padding == 0:
+                continue
+
+            paddingEnd = self.hunkRegion(pair, regionKey).end()
+            paddingBegin = paddingEnd - padding
+
+            if edit != None:
+                editBegin, editEnd, delta = edit
+
+                if paddingBegin >= editEnd:
+                    paddingBegin += delta
+                    paddingEnd += delta
+                elif paddingEnd > editBegin:
+                    continue  # padding touched by the edit is real text now
+
+            parts.append(text[pos:paddingBegin])
+            pos = paddingEnd
+
+        parts.append(text[pos:end])
+
+        return ''.join(parts)
+
+    def replaceChanged(self, view, text, begin, end, contents):
+        changed = self.changedRange(text[begin:end], contents)
+
+        if changed == None:
+            return
+
+        edit = view.begin_edit()
+        view.replace(edit, sublime.Region(begin + changed[0], begin + changed[1]), contents[changed[0]:changed[2]])
+        view.end_edit(edit)
+
+    def findHunk(self, regionKey, position, useEnd):
+        lo = 0
+        hi = len(self.regions)
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            region = self.hunkRegion(self.regions[mid], regionKey)
+
+            if useEnd:
+                found = region.end() >= position
+            else:
+                found = region.begin() > position
+
+            if found:
+                hi = mid
+            else:
+                lo = mid + 1
+
+        return lo
+
+    def textModified(self, view):
+        if self.texts == None or self.editing:
+            return
+
+        if view.id() == self.left.id():
+            side, other = ('left', 'right')
+            regionKey, otherKey = ('regionLeft', 'regionRight')
+        else:
+            side, other = ('right', 'left')
+            regionKey, otherKey = ('regionRight', 'regionLeft')
+
+        paddingKey = regionKey.replace('region', 'padding')
+        otherPaddingKey = otherKey.replace('region', 'padding')
+
+        old = self.texts[side]
+        otherText = self.texts[other]
+        changed = self.editedRange(view, old)
+
+        if changed == None:
+            return
+
+        view.set_scratch(False)
+
+        editBegin, editEnd, newEditEnd = changed
+        delta = newEditEnd - editEnd
+
+        # an insertion or deletion that fits in more places is found as far
+        # right as it goes, which may be inside the padding of a hunk - it is
+        # moved back in front of the padding where the text allows
+        hunk = self.findHunk(regionKey, editBegin, True)
+
+        if hunk < len(self.regions) and self.regions[hunk][paddingKey] > 0:
+            paddingBegin = self.hunkRegion(self.regions[hunk], regionKey).end() - self.regions[hunk][paddingKey]
+
+            if newEditEnd == editBegin:
+                while editEnd > paddingBegin and editBegin > 0 and old[editBegin - 1:editBegin] == old[editEnd - 1:editEnd]:
+                    editBegin -= 1
+                    editEnd -= 1
+                    newEditEnd -= 1
+            elif editEnd == editBegin:
+                while editBegin > paddingBegin and old[editBegin - 1:editBegin] == view.substr(sublime.Region(newEditEnd - 1, newEditEnd)):
+                    editBegin -= 1
+                    editEnd -= 1
+                    newEditEnd -= 1
+
+        # the window to re-diff spans from the hunk before the edit to the
+        # hunk after it - everything outside is known to be aligned
+        first = self.findHunk(regionKey, editBegin, True)
+        last = self.findHunk(regionKey, editEnd, False)
+
+        if first > 0:
+            begin = self.hunkRegion(self.regions[first - 1], regionKey).end()
+            otherBegin = self.hunkRegion(self.regions[first - 1], otherKey).end()
+        else:
+            begin = otherBegin = 0
+
+        # from here on the snapshot is the edited text
+        old.splice(editBegin, editEnd, view.substr(sublime.Region(editBegin, newEditEnd)))
+        new = old
+
+        while True:
+            if last < len(self.regions):
+                end = self.hunkRegion(self.regions[last], regionKey).begin()
+                otherEnd = self.hunkRegion(self.regions[last], otherKey).begin()
+            else:
+                end = len(new) - delta
+                otherEnd = len(otherText)
+
+            hunks = self.regions[first:last]
+            real = self.realText(new, begin, end + delta, hunks, regionKey, paddingKey, (editBegin, editEnd, delta))
+
+            # an edit removing the line break before a hunk joins the first
+            # line of the hunk, so the window takes that hunk in too
+            if last == len(self.regions) or real == '' or real[len(real) - 1] == '\n':
+                break
+
+            last += 1
+
+        otherReal = self.realText(otherText, otherBegin, otherEnd, hunks, otherKey, otherPaddingKey, None)
+
+        if side == 'left':
+            diff = SublimergeDiffer().hunks(real, otherReal, S.get('diff_engine'))
+        else:
+            diff = SublimergeDiffer().hunks(otherReal, real, S.get('diff_engine'))
+
+        leftText, rightText, pairs = self.buildContents(diff)
+
+        if side == 'left':
+            contents, otherContents = (leftText, rightText)
+        else:
+            contents, otherContents = (rightText, leftText)
+
+        self.editing = True
+        self.replaceChanged(view, new, begin, end + delta, contents)
+        self.replaceChanged(getattr(self, other), otherText, otherBegin, otherEnd, otherContents)
+        self.editing = False
+
+        new.splice(begin, end + delta, contents)
+        otherText.splice(otherBegin, otherEnd, otherContents)
+        self.alignment = None
+
+        for pair in hunks:
+            self.left.erase_regions(pair['name'])
+            self.right.erase_regions(pair['name'])
+            self.left.erase_regions('intralines' + pair['name'])
+            self.right.erase_regions('intralines' + pair['name'])
+
+        slotBegin = 0
+        slotEnd = self.offsets[regionKey].size() + 1
+
+        if first > 0:
+            slotBegin = self.regions[first - 1]['slot']
+
+        if last < len(self.regions):
+            slotEnd = self.regions[last]['slot']
+            self.offsets[regionKey].add(slotEnd, begin + len(contents) - end)
+            self.offsets[otherKey].add(slotEnd, otherBegin + len(otherContents) - otherEnd)
+
+        for pair in pairs:
+            pair[regionKey] = self.moveRegionBy(pair[regionKey], begin)
+            pair[otherKey] = self.moveRegionBy(pair[otherKey], otherBegin)
+
+        self.regions[first:last] = pairs
+
+        if slotEnd - slotBegin > len(pairs):
+            step = (slotEnd - slotBegin) // (len(pairs) + 1)
+
+            for i in range(len(pairs)):
+                pairs[i]['slot'] = slotBegin + (i + 1) * step
+                pairs[i][regionKey] = self.moveRegionBy(pairs[i][regionKey], -self.offsets[regionKey].prefix(pairs[i]['slot']))
+                pairs[i][otherKey] = self.moveRegionBy(pairs[i][otherKey], -self.offsets[otherKey].prefix(pairs[i]['slot']))
+        else:
+            self.indexRegions()
+
+        for pair in pairs:
+            self.createDiffRegion(pair)
+
+        if len([pair for pair in hunks if pair is self.currentRegion]) > 0:
+            self.currentRegion = None
+            self.currentDiff = min(first, len(self.regions) - 1)
+        elif self.currentDiff >= last:
+            self.currentDiff += len(pairs) - len(hunks)
+
+        self.updateVisibleIntralines()
+
+    def showIntralines(self, pair):
+        if pair['intralines'] != None:
+            return
+
+        pair['intralines'] = {'left': [], 'right': []}
+
+        if not pair['intraline']:
+            return
+
+        span = trace.begin('intralines')
+        offsets = SublimergeIntralineDiffer().difference("\n".join(pair['mergeRight'].splitlines()), "\n".join(pair['mergeLeft'].splitlines()), S.get('intraline_max_length'))
+        trace.end(span, {'bytes': len(pair['mergeLeft']) + len(pair['mergeRight']), 'ranges': len(offsets['-']) + len(offsets['+'])})
+        pair['intralines'] = {'left': offsets['-'], 'right': offsets['+']}
+
+        leftStart = self.hunkRegion(pair, 'regionLeft').begin()
+        rightStart = self.hunkRegion(pair, 'regionRight').begin()
+        leftRegions = []
+        rightRegions = []
+
+        for position in pair['intralines']['left']:
+            leftRegions.append(sublime.Region(leftStart + position[0], leftStart + position[1]))
+
+        for position in pair['intralines']['right']:
+            rightRegions.append(sublime.Region(rightStart + position[0], rightStart + position[1]))
+
+        self.left.add_regions('intralines' + pair['name'], leftRegions, S.get('diff_region_change_scope'))
+        self.right.add_regions('intralines' + pair['name'], rightRegions, S.get('diff_region_change_scope'))
+
+    def regionsInViewport(self, view, regionKey):
+        visible = view.visible_region()
+        margin = visible.size()
+        begin = visible.begin() - margin
+        end = visible.end() + margin
+
+        lo = 0
+        hi = len(self.regions)
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self.hunkRegion(self.regions[mid], regionKey).end() < begin:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        found = []
+
+        while lo < len(self.regions) and self.hunkRegion(self.regions[lo], regionKey).begin() <= end:
+            found.append(self.regions[lo])
+            lo += 1
+
+        return found
+
+    def updateVisibleIntralines(self):
+        for pair in self.regionsInViewport(self.left, 'regionLeft'):
+            self.showIntralines(pair)
+
+        for pair in self.regionsInViewport(self.right, 'regionRight'):
+            self.showIntralines(pair)
+
+    def createDiffRegion(self, region):
+        rightScope = leftScope = S.get('diff_region_scope')
+
+        if region['mergeLeft'] == '':
+            rightScope = S.get('diff_region_removed_scope')
+            leftScope = S.get('diff_region_added_scope')
+        elif region['mergeRight'] == '':
+            leftScope = S.get('diff_region_removed_scope')
+            rightScope = S.get('diff_region_added_scope')
+
+        self.left.add_regions(region['name'], [self.hunkRegion(region, 'regionLeft')], leftScope, S.get('diff_region_gutter_icon'), sublime.DRAW_OUTLINED)
+        self.right.add_regions(region['name'], [self.hunkRegion(region, 'regionRight')], rightScope, S.get('diff_region_gutter_icon'), sublime.DRAW_OUTLINED)
+
+    def createSelectedRegion(self, region):
+        self.left.add_regions(region['name'], [self.hunkRegion(region, 'regionLeft')], S.get('selected_diff_region_scope'), S.get('selected_diff_region_gutter_icon'))
+        self.right.add_regions(region['name'], [self.hunkRegion(region, 'regionRight')], S.get('selected_diff_region_scope'), S.get('selected_diff_region_gutter_icon'))
+
+    def selectDiff(self, diffIndex):
+        if diffIndex >= 0 and diffIndex < len(self.regions):
+            self.left.sel().clear()
+            self.left.sel().add(sublime.Region(0, 0))
+            self.right.sel().clear()
+            self.right.sel().add(sublime.Region(0, 0))
+
+            if self.currentRegion != None:
+                self.createDiffRegion(self.currentRegion)
+
+            self.currentRegion = self.regions[diffIndex]
+            self.createSelectedRegion(self.currentRegion)
+            self.showIntralines(self.currentRegion)
+
+            self.currentDiff = diffIndex
+
+            regionLeft = self.hunkRegion(self.currentRegion, 'regionLeft')
+            regionRight = self.hunkRegion(self.currentRegion, 'regionRight')
+
+            self.left.show_at_center(sublime.Region(regionLeft.begin(), regionLeft.begin()))
+            self.right.show_at_center(sublime.Region(regionRight.begin(), regionRight.begin()))
+
+            self.updateVisibleIntralines()
+            self.wakeScrollSync()
+
+    def wakeScrollSync(self):
+        if self.scrollSync != None:
+            self.scrollSync.wake()
+
+    def goUp(self):
+        self.selectDiff(self.currentDiff - 1)
+
+    def goDown(self):
+        self.selectDiff(self.currentDiff + 1)
+
+    def merge(self, direction, mergeAll):
+        if self.revision != None and direction == '>>':
+            return
+
+        if mergeAll:
+            span = trace.begin('merge all', {'hunks': len(self.regions)}, 'merge')
+            self.mergeAll(direction)
+            trace.end(span)
+            trace.report('merge')
+            return
+
+        if (self.currentRegion != None):
+            span = trace.begin('merge', {'hunks': 1}, 'merge')
+            lenLeft = self.left.size()
+            lenRight = self.right.size()
+            if direction == '<<':
+                source = self.right
+                target = self.left
+                sourceSide, targetSide = ('right', 'left')
+                sourceRegion = self.hunkRegion(self.currentRegion, 'regionRight')
+                targetRegion = self.hunkRegion(self.currentRegion, 'regionLeft')
+                contents = self.currentRegion['mergeLeft']
+
+            elif direction == '>>':
+                source = self.left
+                target = self.right
+                sourceSide, targetSide = ('left', 'right')
+                sourceRegion = self.hunkRegion(self.currentRegion, 'regionLeft')
+                targetRegion = self.hunkRegion(self.currentRegion, 'regionRight')
+                contents = self.currentRegion['mergeRight']
+
+            target.set_scratch(True)
+
+            target.set_read_only(False)
+            source.set_read_only(False)
+
+            self.editing = True
+
+            edit = target.begin_edit()
+            target.replace(edit, targetRegion, contents)
+            target.end_edit(edit)
+
+            edit = source.begin_edit()
+            source.replace(edit, sourceRegion, contents)
+            source.end_edit(edit)
+
+            self.editing = False
+
+            for side, region in [(targetSide, targetRegion), (sourceSide, sourceRegion)]:
+                self.texts[side].splice(region.begin(), region.end(), contents)
+
+            self.alignment = None
+
+            diffLenLeft = self.left.size() - lenLeft
+            diffLenRight = self.right.size() - lenRight
+
+            source.erase_regions(self.currentRegion['name'])
+            target.erase_regions(self.currentRegion['name'])
+            source.erase_regions('intralines' + self.currentRegion['name'])
+            target.erase_regions('intralines' + self.currentRegion['name'])
+
+            target.set_scratch(False)
+
+            # drawn regions of the following hunks are moved by the editor,
+            # only the offsets index needs to know about the shift
+            self.offsets['regionLeft'].add(self.currentRegion['slot'] + 1, diffLenLeft)
+            self.offsets['regionRight'].add(self.currentRegion['slot'] + 1, diffLenRight)
+
+            del self.regions[self.currentDiff]
+
+            self.lockViews()
+
+            if self.currentDiff > len(self.regions) - 1:
+                self.currentDiff = len(self.regions) - 1
+
+            self.currentRegion = None
+
+            if self.currentDiff >= 0:
+                self.selectDiff(self.currentDiff)
+            else:
+                self.currentDiff = -1
+
+            self.window.focus_view(target)
+
+            trace.end(span, {'bytes': len(contents)})
+            trace.report('merge')
+
+    def mergeAll(self, direction):
+        if len(self.regions) == 0:
+            return
+
+        if direction == '<<':
+            target = self.left
+            contentKey = 'mergeLeft'
+        elif direction == '>>':
+            target = self.right
+            contentKey = 'mergeRight'
+
+        self.left.set_read_only(False)
+        self.right.set_read_only(False)
+        target.set_scratch(True)
+
+        self.editing = True
+
+        for view, regionKey, side in [(self.left, 'regionLeft', 'left'), (self.right, 'regionRight', 'right')]:
+            text = self.texts[side]
+            begin = self.hunkRegion(self.regions[0], regionKey).begin()
+            end = self.hunkRegion(self.regions[len(self.regions) - 1], regionKey).end()
+            parts = []
+            pos = begin
+
+            for pair in self.regions:
+                region = self.hunkRegion(pair, regionKey)
+                parts.append(text[pos:region.begin()])
+                parts.append(pair[contentKey])
+                pos = region.end()
+
+            edit = view.begin_edit()
+            view.replace(edit, sublime.Region(begin, end), ''.join(parts))
+            view.end_edit(edit)
+
+        self.editing = False
+
+        for pair in self.regions:
+            self.left.erase_regions(pair['name'])
+            self.right.erase_regions(pair['name'])
+            self.left.erase_regions('intralines' + pair['name'])
+            self.right.erase_regions('intralines' + pair['name'])
+
+        target.set_scratch(False)
+
+        self.regions = []
+        self.indexRegions()
+        self.currentRegion = None
+        self.currentDiff = -1
+
+        self.lockViews()
+        self.snapshotTexts()
+        self.alignment = None
+
+        self.window.focus_view(target)
+
+    def moveRegionBy(self, region, by):
+        return sublime.Region(region.begin() + by, region.end() + by)
+
+    def abandonUnmergedDiffs(self, side):
+        if side == 'left':
+            view = self.left
+            regionKey = 'regionLeft'
+            contentKey = 'mergeRight'
+        elif side == 'right':
+            view = self.right
+            regionKey = 'regionRight'
+            contentKey = 'mergeLeft'
+
+        if len(self.regions) == 0:
+            return
+
+        text = self.texts[side]
+        begin = self.hunkRegion(self.regions[0], regionKey).begin()
+        end = self.hunkRegion(self.regions[len(self.regions) - 1], regionKey).end()
+        parts = []
+        pos = begin
+
+        shifts = []
+
+        for pair in self.regions:
+            region = self.hunkRegion(pair, regionKey)
+            parts.append(text[pos:region.begin()])
+            parts.append(pair[contentKey])
+            pos = region.end()
+            shifts.append(len(pair[contentKey]) - region.size())
+
+        for i in range(len(self.regions)):
+            if shifts[i] != 0:
+                self.offsets[regionKey].add(self.regions[i]['slot'] + 1, shifts[i])
+
+        contents = ''.join(parts)
+
+        view.set_read_only(False)
+        self.editing = True
+
+        edit = view.begin_edit()
+        view.replace(edit, sublime.Region(begin, end), contents)
+        view.end_edit(edit)
+
+        self.editing = False
+        text.splice(begin, end, contents)
+        self.alignment = None
+        self.lockViews()
+
+
+class SublimergeDiffCache():
+    # bump when the layout of entries stored on disk changes
+    formatVersion = 2
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = {}
+        self.memorySize = 0
+        self.tick = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, text1, text2, engine, ignoreWhitespace):
+        digest = hashlib.sha1()
+        digest.update('%d:%s:%d:%d:%d:' % (self.formatVersion, engine, ignoreWhitespace, len(text1), len(text2)))
+        digest.update(text1.encode('utf-8'))
+        digest.update('\0')
+        digest.update(text2.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def diffSize(self, diff):
+        size = sys.getsizeof(diff)
+        sources = {}
+
+        for part in diff:
+            size += sys.getsizeof(part)
+
+            if isinstance(part, SublimergeHunk):
+                sources[id(part.text1)] = part.text1
+                sources[id(part.text2)] = part.text2
+            else:
+                sources[id(part.source)] = part.source
+
+        # all parts slice the same two texts
+        for text in sources.values():
+            size += sys.getsizeof(text)
+
+        return size
+
+    def get(self, key, text1, text2):
+        self.lock.acquire()
+
+        try:
+            if key in self.entries:
+                self.tick += 1
+                entry = self.entries[key]
+                entry[0] = self.tick
+                self.hits += 1
+                return entry[2]
+        finally:
+            self.lock.release()
+
+        diff = self.readDisk(key, text1, text2)
+
+        self.lock.acquire()
+
+        try:
+            if diff != None:
+                self.diskHits += 1
+            else:
+                self.misses += 1
+        finally:
+            self.lock.release()
+
+        if diff != None:
+            self.storeMemory(key, diff)
+
+        return diff
+
+    def put(self, key, diff):
+        self.storeMemory(key, diff)
+        self.writeDisk(key, diff)
+
+    def storeMemory(self, key, diff):
+        limit = S.get('diff_cache_memory_size') * 1024 * 1024
+        size = self.diffSize(diff)
+
+        if size > limit:
+            return
+
+        self.lock.acquire()
+
+        try:
+            if key in self.entries:
+                self.memorySize -= self.entries[key][1]
+
+            self.tick += 1
+            self.entries[key] = [self.tick, size, diff]
+            self.memorySize += size
+
+            while self.memorySize > limit:
+                oldest = min(self.entries, key=lambda name: self.entries[name][0])
+                self.memorySize -= self.entries[oldest][1]
+                del self.entries[oldest]
+        finally:
+            self.lock.release()
+
+    def diskPath(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def readDisk(self, key, text1, text2):
+        if S.get('diff_cache_disk_size') <= 0:
+            return None
+
+        path = self.diskPath(key)
+
+        try:
+            f = open(path, 'rb')
+
+            try:
+                parts = json.loads(f.read().decode('utf-8'))
+            finally:
+                f.close()
+
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        diff = []
+
+        try:
+            for part in parts:
+                if part[0] == '=':
+                    diff.append(SublimergeEqual(text1, *part[1:7]))
+                else:
+                    diff.append(SublimergeHunk(text1, text2, *part[1:12]))
+        except (IndexError, TypeError):
+            return None
+
+        return diff
+
+    def writeDisk(self, key, diff):
+        limit = S.get('diff_cache_disk_size') * 1024 * 1024
+
+        if limit <= 0:
+            return
+
+        path = self.diskPath(key)
+        tmpPath = '%s.%d.tmp' % (path, threading.current_thread().ident)
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            f = open(tmpPath, 'wb')
+
+            try:
+                f.write(json.dumps(self.packDiff(diff)).encode('utf-8'))
+            finally:
+                f.close()
+
+            if os.path.exists(path):
+                os.remove(path)
+
+            os.rename(tmpPath, path)
+            self.evictDisk(limit)
+        except (IOError, OSError):
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+
+    def packDiff(self, diff):
+        # only the ranges are stored, the texts are known when reading
+        parts = []
+
+        for part in diff:
+            if isinstance(part, SublimergeHunk):
+                parts.append(['!', part.begin1, part.end1, part.begin2, part.end2, part.i1, part.i2, part.j1, part.j2, part.change, part.intraline])
+            else:
+                parts.append(['=', part.begin, part.end, part.i1, part.i2, part.j1, part.j2])
+
+        return parts
+
+    def evictDisk(self, limit):
+        files = []
+        total = 0
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+
+            path = os.path.join(self.directory, name)
+            info = os.stat(path)
+            files.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+
+        files.sort()
+
+        for mtime, size, path in files:
+            if total <= limit:
+                break
+
+            os.remove(path)
+            total -= size
+
+    def stats(self):
+        return 'memory hits: %d, disk hits: %d, misses: %d, %d entries (%d KB) in memory' % (self.hits, self.diskHits, self.misses, len(self.entries), self.memorySize // 1024)
+
+diffCache = SublimergeDiffCache(os.path.join(os.path.dirname(sublime.packages_path()), 'Cache', 'Sublimerge'))
+
+
+class SublimergeRevision():
+    def __init__(self, name, content):
+        self.name = name
+        self.content = content
+
+
+class SublimergeCancelled(Exception):
+    pass
+
+
+class SublimergeDiffThread(threading.Thread):
+    def __init__(self, window, left, right, engine=None):
+        global diffThread
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.window = window
+        self.left = left
+        self.right = right
+        self.engine = engine
+        self.ignoreWhitespace = S.get('ignore_whitespace')
+        self.cancelled = False
+        self.total = 0
+        self.done = 0
+        self.progressFrame = 0
+
+        if engine == None:
+            self.engine = S.get('diff_engine')
+
+        self.text1 = left.substr(sublime.Region(0, left.size()))
+
+        if isinstance(right, SublimergeRevision):
+            self.text2 = None
+        else:
+            self.text2 = right.substr(sublime.Region(0, right.size()))
+
+        if diffThread != None:
+            diffThread.cancel()
+
+        diffThread = self
+
+        self.left.set_status('sublimerge-computing-diff', 'Computing differences...')
+        self.start()
+        sublime.set_timeout(self.showProgress, 100)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise SublimergeCancelled()
+
+    def begin(self, total):
+        self.total = total
+        self.done = 0
+
+    def advance(self, lines):
+        self.done += lines
+        self.check()
+
+    def showProgress(self):
+        if not self.is_alive() or self.cancelled:
+            return
+
+        if self.total > 0:
+            progress = '%d%%' % (min(100, 100 * self.done // self.total))
+        else:
+            progress = '.' * (self.progressFrame % 3 + 1)
+
+        self.progressFrame += 1
+        self.left.set_status('sublimerge-computing-diff', 'Computing differences... ' + progress)
+        sublime.set_timeout(self.showProgress, 100)
+
+    def run(self):
+        try:
+            text1 = self.text1
+
+            span = trace.begin('read', None, 'comparison')
+
+            if self.text2 == None:
+                text2 = self.right.content.decode('utf-8', 'replace').replace('\r\n', '\n')
+            else:
+                text2 = self.text2
+
+            trace.end(span, {'bytes': len(text1) + len(text2)})
+
+            self.check()
+
+            span = trace.begin('cache lookup', None, 'comparison')
+            key = diffCache.key(text1, text2, self.engine, self.ignoreWhitespace)
+            diff = diffCache.get(key, text1, text2)
+            trace.end(span, {'hit': diff != None})
+
+            if diff == None:
+                span = trace.begin('diff', {'engine': self.engine, 'bytes': len(text1) + len(text2)}, 'comparison')
+                differ = SublimergeDiffer()
+                diff = differ.hunks(text1, text2, self.engine, self)
+                trace.end(span, {'hunks': len([part for part in diff if isinstance(part, SublimergeHunk)]), 'trimmed lines': differ.trimmedLines})
+
+                self.check()
+                diffCache.put(key, diff)
+
+            if S.get('stage_timing'):
+                print "Sublimerge: diff cache %s" % (diffCache.stats())
+
+            self.check()
+
+            span = trace.begin('whitespace check', None, 'comparison')
+            differs = SublimergeDiffer().differs(text1, text2, self.ignoreWhitespace)
+            trace.end(span, {'ignore_whitespace': self.ignoreWhitespace})
+
+        except SublimergeCancelled:
+            sublime.set_timeout(lambda: self.finish(None, False), 0)
+            return
+
+        sublime.set_timeout(lambda: self.finish(diff, differs), 0)
+
+    def finish(self, diff, differs):
+        global diffView, diffThread
+
+        if diffThread == self:
+            diffThread = None
+
+        if self.cancelled:
+            if diffThread == None or diffThread.left.id() != self.left.id():
+                self.left.erase_status('sublimerge-computing-diff')
+            return
+
+        self.left.erase_status('sublimerge-computing-diff')
+
+        if not differs:
+            sublime.message_dialog('There is no difference between files')
+            return
+
+        diffView = SublimergeView(self.window, self.left, self.right, diff)
+
+
+class SublimergeVcsRoots():
+    ttl = 60
+
+    def __init__(self):
+        self.roots = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, path):
+        visited = []
+        found = (None, None)
+        now = time.time()
+
+        self.lock.acquire()
+
+        try:
+            while True:
+                entry = self.roots.get(path)
+
+                if entry != None and self.valid(entry, now):
+                    found = (entry[0], entry[1])
+                    break
+
+                visited.append(path)
+                vcs = self.marker(path)
+
+                if vcs != None:
+                    found = (vcs, path)
+                    break
+
+                parent = os.path.dirname(path)
+
+                if parent == path or parent == '':
+                    break
+
+                path = parent
+
+            for path in visited:
+                self.roots[path] = (found[0], found[1], now)
+        finally:
+            self.lock.release()
+
+        return found
+
+    def valid(self, entry, now):
+        if now - entry[2] > self.ttl:
+            return False
+
+        return entry[0] == None or self.marker(entry[1]) == entry[0]
+
+    def marker(self, path):
+        if os.path.isdir(os.path.join(path, '.svn')):
+            return 'svn'
+
+        git = os.path.join(path, '.git')
+
+        if os.path.isdir(git):
+            return 'git'
+
+        # worktrees and submodules have a .git file pointing to the repository
+        if os.path.isfile(git):
+            try:
+                f = open(git, 'rb')
+
+                try:
+                    if f.read(7) == 'gitdir:':
+                        return 'git'
+                finally:
+                    f.close()
+            except IOError:
+                pass
+
+        return None
+
+vcsRoots = SublimergeVcsRoots()
+
+
+class SublimergeGitCatFile():
+    idleTimeout = 60
+
+    def __init__(self, root):
+        self.root = root
+        self.process = None
+        self.lastUsed = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        print "Cmd: %s cat-file --batch" % (S.get('git_executable_path'))
+        print "Dir: %s" % (self.root)
+
+        self.process = subprocess.Popen([S.get('git_executable_path'), 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=self.root)
+
+    def stop(self):
+        if self.process != None:
+            try:
+                self.process.stdin.close()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+
+            self.process = None
+
+    def request(self, name):
+        if self.process == None or self.process.poll() != None:
+            self.start()
+
+        self.process.stdin.write(name + '\n')
+        self.process.stdin.flush()
+
+        header = self.process.stdout.readline()
+
+        if header == '':
+            raise IOError('git cat-file exited')
+
+        header = header.split()
+
+        if len(header) != 3:
+            return None
+
+        size = int(header[2])
+        content = self.process.stdout.read(size)
+        self.process.stdout.read(1)
+
+        if len(content) != size:
+            raise IOError('git cat-file exited')
 
-        edit = right.begin_edit()
-        right.erase(edit, sublime.Region(0, right.size()))
-        right.end_edit(edit)
+        return content
 
-        regions = []
-        i = 0
+    def read(self, revision, path):
+        # path is relative to the repository root, returns the raw bytes or
+        # None when there is no such file in the revision
+        name = (u'%s:%s' % (revision, path.replace(os.sep, '/'))).encode('utf-8')
 
-        for part in diff:
-            if not isinstance(part, dict):
-                edit = left.begin_edit()
-                left.insert(edit, left.size(), part)
-                left.end_edit(edit)
-
-                edit = right.begin_edit()
-                right.insert(edit, right.size(), part)
-                right.end_edit(edit)
-            else:
-                if S.get('ignore_whitespace'):
-                    trimRe = '(^\s+)|(\s+$)'
-                    if re.sub(trimRe, '', part['+']) == re.sub(trimRe, '', part['-']):
-                        edit = left.begin_edit()
-                        left.insert(edit, left.size(), part['-'])
-                        left.end_edit(edit)
-
-                        edit = right.begin_edit()
-                        right.insert(edit, right.size(), part['+'])
-                        right.end_edit(edit)
-                        continue
+        self.lock.acquire()
+        span = trace.begin('git cat-file', None, 'comparison')
 
-                pair = {
-                    'regionLeft': None,
-                    'regionRight': None,
-                    'name': 'diff' + str(i),
-                    'mergeLeft': part['+'][:],
-                    'mergeRight': part['-'][:],
-                    'intralines': {'left': [], 'right': []}
-                }
+        try:
+            try:
+                content = self.request(name)
+            except (IOError, OSError, ValueError):
+                self.stop()
+                content = self.request(name)
 
-                i += 1
+            self.lastUsed = time.time()
+        finally:
+            self.lock.release()
 
-                edit = left.begin_edit()
-                leftStart = left.size()
+        trace.end(span, {'bytes': content != None and len(content) or 0})
 
-                if part['+'] != '' and part['-'] != '' and part['intraline'] != '':
-                    inlines = list(difflib.Differ().compare(part['-'].splitlines(1), part['+'].splitlines(1)))
-                    begins = {'+': 0, '-': 0}
-                    lastLen = 0
-                    lastChange = None
+        sublime.set_timeout(self.stopIfIdle, self.idleTimeout * 1000)
 
-                    for inline in inlines:
-                        change = inline[0:1]
-                        inline = inline[2:len(inline)]
-                        inlineLen = len(inline)
+        return content
 
-                        if change != '?':
-                            begins[change] += inlineLen
-                            lastLen = inlineLen
-                            lastChange = change
-                        else:
-                            for m in re.finditer('([+-^]+)', inline):
-                                sign = m.group(0)[0:1]
+    def stopIfIdle(self):
+        # runs on the main thread, so a read in progress is not waited for
+        if not self.lock.acquire(False):
+            sublime.set_timeout(self.stopIfIdle, self.idleTimeout * 1000)
+            return
 
-                                if sign == '^':
-                                    sign = lastChange
+        try:
+            if time.time() - self.lastUsed >= self.idleTimeout:
+                self.stop()
+        finally:
+            self.lock.release()
 
-                                part['intralines'][sign].append([begins[sign] - lastLen + m.start(), begins[sign] - lastLen + m.end()])
 
-                enlarged = self.enlargeCorrespondingPart(part['+'], part['-'])
+class SublimergeProcess(threading.Thread):
+    def __init__(self, argv, cwd, onDone, onChunk=None, timeout=None, operation=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
 
-                left.insert(edit, leftStart, enlarged[1])
-                left.end_edit(edit)
+        self.argv = argv
+        self.cwd = cwd
+        self.onDone = onDone
+        self.onChunk = onChunk
+        self.timeout = timeout
+        self.operation = operation
+        self.process = None
+        self.returncode = None
+        self.stdout = ''
+        self.stderr = ''
+        self.timedOut = False
 
-                edit = right.begin_edit()
-                rightStart = right.size()
-                right.insert(edit, rightStart, enlarged[0])
-                right.end_edit(edit)
+        if timeout == None:
+            self.timeout = S.get('vcs_timeout')
 
-                pair['regionLeft'] = sublime.Region(leftStart, leftStart + len(left.substr(sublime.Region(leftStart, left.size()))))
-                pair['regionRight'] = sublime.Region(rightStart, rightStart + len(right.substr(sublime.Region(rightStart, right.size()))))
+        self.start()
 
-                if pair['regionLeft'] != None and pair['regionRight'] != None:
-                    for position in part['intralines']['-']:
-                        change = sublime.Region(leftStart + position[0], leftStart + position[1])
-                        pair['intralines']['left'].append(change)
+    def run(self):
+        print "Cmd: %s" % (' '.join(self.argv))
+        print "Dir: %s" % (self.cwd)
 
-                    for position in part['intralines']['+']:
-                        change = sublime.Region(rightStart + position[0], rightStart + position[1])
-                        pair['intralines']['right'].append(change)
+        encoding = 'utf-8'
 
-                    regions.append(pair)
+        if os.name == 'nt':
+            encoding = 'mbcs'
+        argv = [isinstance(arg, unicode) and arg.encode(encoding) or arg for arg in self.argv]
 
-        for pair in regions:
-            self.createDiffRegion(pair)
+        try:
+            self.process = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=self.cwd)
+            self.process.stdin.close()
+        except OSError, e:
+            self.stderr = 'Could not run `%s`: %s' % (self.argv[0], e)
+            sublime.set_timeout(lambda: self.onDone(self), 0)
+            return
 
-        self.createdPositions = True
+        timer = None
 
-        self.regions = regions
-        sublime.set_timeout(lambda: self.selectDiff(0), 100)  # for some reason this fixes the problem to scroll both views to proper position after loading diff
+        if self.timeout > 0:
+            timer = threading.Timer(self.timeout, self.kill)
+            timer.start()
 
-        self.left.set_read_only(True)
-        self.right.set_read_only(True)
-        SublimergeScrollSync(self.left, self.right)
+        errors = []
+        reader = threading.Thread(target=self.readAll, args=(self.process.stderr, errors))
+        reader.daemon = True
+        reader.start()
 
-    def createDiffRegion(self, region):
-        rightScope = leftScope = S.get('diff_region_scope')
+        span = trace.begin(' '.join([os.path.basename(self.argv[0])] + self.argv[1:2]), None, self.operation)
+        output = []
+        size = 0
 
-        if region['mergeLeft'] == '':
-            rightScope = S.get('diff_region_removed_scope')
-            leftScope = S.get('diff_region_added_scope')
-        elif region['mergeRight'] == '':
-            leftScope = S.get('diff_region_removed_scope')
-            rightScope = S.get('diff_region_added_scope')
+        for chunk in self.chunks(self.process.stdout):
+            size += len(chunk)
 
-        if not self.createdPositions:
-            self.left.add_regions('intralines' + region['name'], region['intralines']['left'], S.get('diff_region_change_scope'))
-            self.right.add_regions('intralines' + region['name'], region['intralines']['right'], S.get('diff_region_change_scope'))
+            if self.onChunk != None:
+                self.onChunk(chunk)
+            else:
+                output.append(chunk)
 
-        self.left.add_regions(region['name'], [region['regionLeft']], leftScope, S.get('diff_region_gutter_icon'), sublime.DRAW_OUTLINED)
-        self.right.add_regions(region['name'], [region['regionRight']], rightScope, S.get('diff_region_gutter_icon'), sublime.DRAW_OUTLINED)
+        reader.join()
+        self.returncode = self.process.wait()
+        trace.end(span, {'bytes': size, 'exitcode': self.returncode})
 
-    def createSelectedRegion(self, region):
-        self.left.add_regions(region['name'], [region['regionLeft']], S.get('selected_diff_region_scope'), S.get('selected_diff_region_gutter_icon'))
-        self.right.add_regions(region['name'], [region['regionRight']], S.get('selected_diff_region_scope'), S.get('selected_diff_region_gutter_icon'))
+        if timer != None:
+            timer.cancel()
 
-    def selectDiff(self, diffIndex):
-        if diffIndex >= 0 and diffIndex < len(self.regions):
-            self.left.sel().clear()
-            self.left.sel().add(sublime.Region(0, 0))
-            self.right.sel().clear()
-            self.right.sel().add(sublime.Region(0, 0))
+        self.stdout = ''.join(output)
+        self.stderr = ''.join(errors)
 
-            if self.currentRegion != None:
-                self.createDiffRegion(self.currentRegion)
+        sublime.set_timeout(lambda: self.onDone(self), 0)
 
-            self.currentRegion = self.regions[diffIndex]
-            self.createSelectedRegion(self.currentRegion)
+    def chunks(self, pipe):
+        while True:
+            chunk = os.read(pipe.fileno(), 65536)
 
-            self.currentDiff = diffIndex
+            if chunk == '':
+                break
 
-            self.left.show_at_center(sublime.Region(self.currentRegion['regionLeft'].begin(), self.currentRegion['regionLeft'].begin()))
-            if not S.get('ignore_whitespace'):  # @todo: temporary fix for loosing view sync while ignore_whitespace is true
-                self.right.show_at_center(sublime.Region(self.currentRegion['regionRight'].begin(), self.currentRegion['regionRight'].begin()))
+            yield chunk
 
-    def goUp(self):
-        self.selectDiff(self.currentDiff - 1)
+    def readAll(self, pipe, output):
+        for chunk in self.chunks(pipe):
+            output.append(chunk)
 
-    def goDown(self):
-        self.selectDiff(self.currentDiff + 1)
+    def kill(self):
+        self.timedOut = True
 
-    def merge(self, direction, mergeAll):
-        if self.tmpFile != '' and direction == '>>':
-            return
+        try:
+            self.process.kill()
+        except OSError:
+            pass
 
-        if mergeAll:
-            while len(self.regions) > 0:
-                self.merge(direction, False)
-            return
 
-        if (self.currentRegion != None):
-            lenLeft = self.left.size()
-            lenRight = self.right.size()
-            if direction == '<<':
-                source = self.right
-                target = self.left
-                sourceRegion = self.currentRegion['regionRight']
-                targetRegion = self.currentRegion['regionLeft']
-                contents = self.currentRegion['mergeLeft']
+class SublimergeSvnLogParser():
+    def __init__(self):
+        self.entries = []
+        self.entry = None
+        self.text = []
+        self.failed = False
 
-            elif direction == '>>':
-                source = self.left
-                target = self.right
-                sourceRegion = self.currentRegion['regionLeft']
-                targetRegion = self.currentRegion['regionRight']
-                contents = self.currentRegion['mergeRight']
+        self.parser = ParserCreate()
+        self.parser.StartElementHandler = self.startElement
+        self.parser.EndElementHandler = self.endElement
+        self.parser.CharacterDataHandler = self.text.append
 
-            target.set_scratch(True)
+    def feed(self, data):
+        if not self.failed:
+            try:
+                self.parser.Parse(data, False)
+            except ExpatError:
+                self.failed = True
 
-            target.set_read_only(False)
-            source.set_read_only(False)
+    def startElement(self, name, attributes):
+        if name == 'logentry':
+            self.entry = {'commit': attributes.get('revision'), 'author': '', 'date': '', 'msg': []}
 
-            edit = target.begin_edit()
-            target.replace(edit, targetRegion, contents)
-            target.end_edit(edit)
+        del self.text[:]
 
-            edit = source.begin_edit()
-            source.replace(edit, sourceRegion, contents)
-            source.end_edit(edit)
+    def endElement(self, name):
+        if self.entry == None:
+            return
 
-            diffLenLeft = self.left.size() - lenLeft
-            diffLenRight = self.right.size() - lenRight
+        if name == 'author' or name == 'date':
+            self.entry[name] = ''.join(self.text)
+        elif name == 'msg':
+            self.entry['msg'] = ''.join(self.text).splitlines()
+        elif name == 'logentry':
+            self.entries.append(self.entry)
+            self.entry = None
 
-            source.erase_regions(self.currentRegion['name'])
-            target.erase_regions(self.currentRegion['name'])
-            source.erase_regions('intralines' + self.currentRegion['name'])
-            target.erase_regions('intralines' + self.currentRegion['name'])
 
-            target.set_scratch(False)
+class SublimergeComparableFiles():
+    maxRatios = 10000
 
-            del self.regions[self.currentDiff]
+    def __init__(self):
+        self.windows = {}
+        self.counts = {}
+        self.ratios = {}
+        self.dirty = True
+        self.scheduled = False
 
-            for i in range(self.currentDiff, len(self.regions)):
-                self.regions[i]['regionLeft'] = self.moveRegionBy(self.regions[i]['regionLeft'], diffLenLeft)
-                self.regions[i]['regionRight'] = self.moveRegionBy(self.regions[i]['regionRight'], diffLenRight)
+    def invalidate(self):
+        self.dirty = True
 
-                # for j in range(self.currentDiff, len(self.regions[i]['intralines']['left'])):
-                #     self.regions[i]['intralines']['left'][j] = self.moveRegionBy(self.regions[i]['intralines']['left'][j], diffLenLeft)
+        if not self.scheduled:
+            self.scheduled = True
+            sublime.set_timeout(self.refresh, 100)
 
-                # for j in range(self.currentDiff, len(self.regions[i]['intralines']['right'])):
-                #     self.regions[i]['intralines']['right'][j] = self.moveRegionBy(self.regions[i]['intralines']['right'][j], diffLenRight)
+    def refresh(self):
+        self.scheduled = False
+        self.dirty = False
+        self.windows = {}
+        self.counts = {}
 
-                if i != self.currentDiff:
-                    self.createDiffRegion(self.regions[i])
+        for window in sublime.windows():
+            self.add(window)
 
-            target.set_read_only(True)
-            source.set_read_only(True)
+    def add(self, window):
+        views = window.views()
+        self.windows[window.id()] = self.build(views)
+        self.counts[window.id()] = len(views)
 
-            if self.currentDiff > len(self.regions) - 1:
-                self.currentDiff = len(self.regions) - 1
+    def activated(self, window):
+        # a tab dragged between windows only activates the moved view, so
+        # the windows are rebuilt when one of them has another number of views
+        if window != None and window.id() in self.counts and self.counts[window.id()] != len(window.views()):
+            self.invalidate()
 
-            self.currentRegion = None
+    def files(self, window):
+        if self.dirty:
+            self.refresh()
 
-            if self.currentDiff >= 0:
-                self.selectDiff(self.currentDiff)
-            else:
-                self.currentDiff = -1
+        if window.id() not in self.windows:
+            self.add(window)
 
-            self.window.focus_view(target)
+        return self.windows[window.id()]
 
-    def moveRegionBy(self, region, by):
-        return sublime.Region(region.begin() + by, region.end() + by)
+    def build(self, views):
+        files = []
+        seen = set()
 
-    def abandonUnmergedDiffs(self, side):
-        if side == 'left':
-            view = self.left
-            regionKey = 'regionLeft'
-            contentKey = 'mergeRight'
-        elif side == 'right':
-            view = self.right
-            regionKey = 'regionRight'
-            contentKey = 'mergeLeft'
+        for view in views:
+            name = view.file_name()
 
-        view.set_read_only(False)
-        edit = view.begin_edit()
+            if name == None or name in seen:
+                continue
 
-        for i in range(len(self.regions)):
-            sizeBefore = view.size()
-            view.replace(edit, self.regions[i][regionKey], self.regions[i][contentKey])
-            sizeDiff = view.size() - sizeBefore
+            seen.add(name)
+            sp = os.path.split(name)
+            files.append({'view': view, 'file': name, 'basename': sp[1]})
 
-            if sizeDiff != 0:
-                for j in range(i, len(self.regions)):
-                    self.regions[j][regionKey] = sublime.Region(self.regions[j][regionKey].begin() + sizeDiff, self.regions[j][regionKey].end() + sizeDiff)
+        return files
 
-        view.end_edit(edit)
-        view.set_read_only(True)
+    def dirnames(self, entries):
+        # only listed files sharing a name need their directories to tell
+        # them apart, each is told apart from the last other one listed
+        groups = {}
 
+        for entry in entries:
+            groups.setdefault(entry['basename'], []).append(entry)
 
-class SublimergeDiffThread():
-    def __init__(self, window, left, right):
-        self.window = window
-        self.left = left
-        self.right = right
-        sublime.set_timeout(self.run, 0)
+        for group in groups.values():
+            for entry in group:
+                entry['dirname'] = ''
 
-    def run(self):
-        global diffView
-        text1 = self.left.substr(sublime.Region(0, self.left.size()))
+                for other in reversed(group):
+                    if other is not entry:
+                        entry['dirname'] = self.getFirstDifferentDir(os.path.split(entry['file'])[0], os.path.split(other['file'])[0])
+                        break
 
-        if isinstance(self.right, unicode):
-            text2 = open(self.right, 'rb').read().decode('utf-8', 'replace')
-        else:
-            text2 = self.right.substr(sublime.Region(0, self.right.size()))
+    def getFirstDifferentDir(self, a, b):
+        a1 = re.split('[/\\\]', a)
+        a2 = re.split('[/\\\]', b)
 
-        diff = SublimergeDiffer().difference(text1, text2)
+        len2 = len(a2) - 1
 
-        differs = False
+        for i in range(len(a1)):
+            if i > len2 or a1[i] != a2[i]:
+                return a1[i]
 
-        if S.get('ignore_whitespace'):
-            regexp = re.compile('(^\s+)|(\s+$)', re.MULTILINE)
-            if re.sub(regexp, '', text1) != re.sub(regexp, '', text2):
-                differs = True
-        elif text1 != text2:
-            differs = True
+    def ratio(self, name1, name2):
+        key = (name1, name2)
 
-        if not differs:
-            sublime.message_dialog('There is no difference between files')
-            return
+        if key not in self.ratios:
+            if len(self.ratios) >= self.maxRatios:
+                self.ratios = {}
 
-        diffView = SublimergeView(self.window, self.left, self.right, diff)
-        self.left.erase_status('sublimerge-computing-diff')
+            self.ratios[key] = difflib.SequenceMatcher(None, name1, name2).ratio()
+
+        return self.ratios[key]
+
+comparableFiles = SublimergeComparableFiles()
 
 
 class SublimergeCommand(sublime_plugin.WindowCommand):
@@ -576,37 +2016,33 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
     viewsList = []
     itemsList = []
     commits = []
+    commitStack = []
     window = None
     view = None
+    engine = None
+    vcsRoot = None
+    logPageSize = 100
 
     def lookForVcs(self, path):
         if not S.get('vcs_support'):
             return False
 
-        if os.path.isdir(path + '/.svn'):
-            return 'svn'
-        elif os.path.isdir(path + '/.git'):
-            return 'git'
-        else:
-            sp = os.path.split(path)
-            if sp[0] != path and sp[0] != '':
-                return self.lookForVcs(sp[0])
-
-    def executeShellCmd(self, exe, cwd):
-        print "Cmd: %s" % (exe)
-        print "Dir: %s" % (cwd)
+        vcs, self.vcsRoot = vcsRoots.lookup(path)
 
-        p = subprocess.Popen(exe, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd, shell=True)
+        return vcs
 
-        while(True):
-            retcode = p.poll()
-            line = re.sub('(^\s+$)|(\s+$)', '', p.stdout.readline())
+    def splitArgs(self, name):
+        return shlex.split(S.get(name).encode('utf-8'))
 
-            if line != '':
-                yield line
+    def showProcessError(self, process):
+        self.active.erase_status('sublimerge-status')
 
-            if retcode is not None:
-                break
+        if process.timedOut:
+            sublime.error_message('Command `%s` timed out' % (' '.join(process.argv)))
+        elif process.stderr != '':
+            sublime.error_message(process.stderr.decode('utf-8', 'replace'))
+        else:
+            sublime.error_message('Command `%s` failed with exit code %s' % (' '.join(process.argv), process.returncode))
 
     def getComparableFiles(self):
         self.viewsList = []
@@ -614,37 +2050,24 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
         active = self.window.active_view()
 
         if self.saved(active):
-            allViews = self.window.views()
             ratios = []
             if S.get('intelligent_files_sort'):
                 original = os.path.split(active.file_name())
 
-            for view in allViews:
-                if view.file_name() != None and view.file_name() != active.file_name() and (not S.get('same_syntax_only') or view.settings().get('syntax') == active.settings().get('syntax')):
-                    f = view.file_name()
+            for entry in comparableFiles.files(self.window):
+                view = entry['view']
 
+                if entry['file'] != active.file_name() and (not S.get('same_syntax_only') or view.settings().get('syntax') == active.settings().get('syntax')):
                     ratio = 0
 
                     if S.get('intelligent_files_sort'):
-                        ratio = difflib.SequenceMatcher(None, original[1], os.path.split(f)[1]).ratio()
-
-                    ratios.append({'ratio': ratio, 'file': f, 'dirname': ''})
+                        ratio = comparableFiles.ratio(original[1], entry['basename'])
 
-            ratiosLength = len(ratios)
+                    ratios.append({'ratio': ratio, 'file': entry['file'], 'basename': entry['basename']})
 
-            if ratiosLength > 0:
-                ratios.sort(self.sortFiles)
-
-                if S.get('compact_files_list'):
-                    for i in range(ratiosLength):
-                        for j in range(ratiosLength):
-                            if i != j:
-                                sp1 = os.path.split(ratios[i]['file'])
-                                sp2 = os.path.split(ratios[j]['file'])
-
-                                if sp1[1] == sp2[1]:
-                                    ratios[i]['dirname'] = self.getFirstDifferentDir(sp1[0], sp2[0])
-                                    ratios[j]['dirname'] = self.getFirstDifferentDir(sp2[0], sp1[0])
+            if len(ratios) > 0:
+                ratios.sort(key=lambda f: -f['ratio'])
+                comparableFiles.dirnames(ratios)
 
                 for f in ratios:
                     self.viewsPaths.append(f['file'])
@@ -660,9 +2083,10 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
 
                 sublime.error_message('There are no other open files to compare')
 
-    def run(self):
+    def run(self, engine=None):
         self.window = sublime.active_window()
         self.active = self.window.active_view()
+        self.engine = engine
 
         sp = os.path.split(self.active.file_name())
         vcs = self.lookForVcs(sp[0])
@@ -689,97 +2113,138 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
             self.getComparableFiles()
 
     def fetchFromSvn(self):
-        sp = os.path.split(self.active.file_name())
-        cmd = '%s log "%s" --xml %s' % (S.get('svn_executable_path'), sp[1], S.get('svn_log_args'))
-        xml = ''
-
-        for line in self.executeShellCmd(cmd, sp[0]):
-            xml += line
-
-        if xml != '':
-            dom = minidom.parseString(xml)
-            commitStack = []
-            for entry in dom.getElementsByTagName('logentry'):
-                author = entry.getElementsByTagName('author')[0].childNodes[0].nodeValue
-                date = entry.getElementsByTagName('date')[0].childNodes[0].nodeValue
-                msgs = entry.getElementsByTagName('msg')
-
-                if len(msgs) > 0 and len(msgs[0].childNodes) > 0:
-                    msg = msgs[0].childNodes[0].nodeValue.splitlines()
-                else:
-                    msg = []
+        self.commitStack = []
+        self.fetchSvnPage()
 
-                commitStack.append({'commit': entry.getAttribute('revision'), 'author': author, 'date': date, 'msg': msg})
+    def fetchSvnPage(self):
+        parser = SublimergeSvnLogParser()
+        revisions = []
 
-            self.displayQuickPanel(commitStack, self.onListSelectSvn)
+        if len(self.commitStack) > 0:
+            revisions = ['-r', '%d:1' % (int(self.commitStack[-1]['commit']) - 1)]
 
-        return
+        sp = os.path.split(self.active.file_name())
 
-    def onListSelectSvn(self, index):
-        if index >= 0:
-            sp = os.path.split(self.active.file_name())
+        def onDone(process):
+            if process.returncode != 0 and len(parser.entries) == 0:
+                self.showProcessError(process)
+                return
 
-            outfile = '%s/%s@%s' % (sp[0], sp[1], self.commits[index])
+            trace.report('svn log')
+            self.commitStack.extend(parser.entries[0:self.logPageSize])
+            self.displayQuickPanel(self.commitStack, self.onListSelectSvn, len(parser.entries) > self.logPageSize)
 
-            cmd = '%s cat "%s"@%s %s > %s' % (S.get('svn_executable_path'), sp[1], self.commits[index], S.get('svn_cat_args'), outfile)
+        argv = [S.get('svn_executable_path'), 'log', sp[1], '--xml'] + self.splitArgs('svn_log_args') + revisions + ['--limit', str(self.logPageSize + 1)]
+        SublimergeProcess(argv, sp[0], onDone, parser.feed, None, 'svn log')
 
-            for line in self.executeShellCmd(cmd, sp[0]):
-                print line
+    def onListSelectSvn(self, index):
+        if index == len(self.commits):
+            self.active.set_status('sublimerge-status', 'Fetching commits history...')
+            sublime.set_timeout(self.fetchSvnPage, 100)
+        elif index >= 0:
+            sp = os.path.split(self.active.file_name())
+            name = '%s@%s' % (sp[1], self.commits[index])
 
-            SublimergeDiffThread(self.window, self.active, outfile)
+            argv = [S.get('svn_executable_path'), 'cat', name] + self.splitArgs('svn_cat_args')
+            self.fetchRevision(argv, sp[0], name)
 
         return
 
     def fetchFromGit(self):
-        commitStack = []
-        outputStack = []
-
-        def addCommitStack(line):
-            match = re.match('^commit\s+([a-zA-Z0-9]+)$', line)
-
-            if match:
-                commitStack.append({'commit': match.group(1), 'date': '', 'author': '', 'msg': []})
-            elif len(commitStack) > 0:
-                match = re.match('^Author:\s+(.+)$', line)
-                if match:
-                    commitStack[len(commitStack) - 1]['author'] = match.group(1).decode('utf-8', 'replace')
-                else:
-                    match = re.match('^Date:\s+(.+)$', line)
-                    if match:
-                        commitStack[len(commitStack) - 1]['date'] = match.group(1).decode('utf-8', 'replace')
-                    else:
-                        commitStack[len(commitStack) - 1]['msg'].append(line.decode('utf-8', 'replace'))
-            else:
-                outputStack.append(line.decode('utf-8', 'replace'))
+        self.commitStack = []
+        self.fetchGitPage()
+
+    def fetchGitPage(self):
+        page = []
+        pending = ['']
 
         sp = os.path.split(self.active.file_name())
 
-        cmd = '%s log %s -- "%s"' % (S.get('git_executable_path'), S.get('git_log_args'), sp[1])
+        def onChunk(chunk):
+            records = (pending[0] + chunk).split('\0')
+            pending[0] = records.pop()
 
-        for line in self.executeShellCmd(cmd, sp[0]):
-            addCommitStack(line)
+            for record in records:
+                fields = record.decode('utf-8', 'replace').split(u'\x1f')
 
-        if len(outputStack) > 0:
-            sublime.error_message("\n".join(outputStack))
-            return
+                if len(fields) == 4:
+                    page.append({'commit': fields[0].strip(), 'author': fields[1], 'date': fields[2], 'msg': [fields[3]]})
 
-        self.displayQuickPanel(commitStack, self.onListSelectGit)
+        def onDone(process):
+            if process.returncode != 0:
+                self.showProcessError(process)
+                return
+
+            trace.report('git log')
+            self.commitStack.extend(page[0:self.logPageSize])
+            self.displayQuickPanel(self.commitStack, self.onListSelectGit, len(page) > self.logPageSize)
+
+        argv = [S.get('git_executable_path'), 'log'] + self.splitArgs('git_log_args') + ['-z', '--format=%H%x1f%an%x1f%ad%x1f%s', '--skip=%d' % (len(self.commitStack)), '--max-count=%d' % (self.logPageSize + 1), '--', sp[1]]
+        SublimergeProcess(argv, sp[0], onDone, onChunk, None, 'git log')
 
     def onListSelectGit(self, index):
         sp = os.path.split(self.active.file_name())
 
-        if index >= 0:
-            outfile = '%s/%s@%s' % (sp[0], sp[1], self.commits[index][0:10])
-            cmd = '%s show %s %s:"./%s" > %s' % (S.get('git_executable_path'), S.get('git_show_args'), self.commits[index], sp[1], outfile)
+        if index == len(self.commits):
+            self.active.set_status('sublimerge-status', 'Fetching commits history...')
+            sublime.set_timeout(self.fetchGitPage, 100)
+        elif index >= 0:
+            name = '%s@%s' % (sp[1], self.commits[index][0:10])
 
-            for line in self.executeShellCmd(cmd, sp[0]):
-                print line
-
-            SublimergeDiffThread(self.window, self.active, outfile)
+            if S.get('git_show_args') != '':
+                argv = [S.get('git_executable_path'), 'show'] + self.splitArgs('git_show_args') + ['%s:./%s' % (self.commits[index], sp[1])]
+                self.fetchRevision(argv, sp[0], name)
+            else:
+                self.readGitRevision(self.commits[index], name)
 
         return False
 
-    def displayQuickPanel(self, commitStack, callback):
+    def fetchRevision(self, argv, cwd, name):
+        self.active.set_status('sublimerge-status', 'Fetching revision...')
+
+        def onDone(process):
+            if process.returncode != 0:
+                self.showProcessError(process)
+                return
+
+            self.compareToRevision(name, process.stdout)
+
+        SublimergeProcess(argv, cwd, onDone, None, None, 'comparison')
+
+    def readGitRevision(self, commit, name):
+        if self.vcsRoot not in gitCatFiles:
+            gitCatFiles[self.vcsRoot] = SublimergeGitCatFile(self.vcsRoot)
+
+        catFile = gitCatFiles[self.vcsRoot]
+        path = os.path.relpath(self.active.file_name(), self.vcsRoot)
+
+        self.active.set_status('sublimerge-status', 'Fetching revision...')
+
+        def read():
+            try:
+                content = catFile.read(commit, path)
+            except (IOError, OSError), e:
+                sublime.set_timeout(lambda: self.showRevisionError('Could not run git cat-file: %s' % (e)), 0)
+                return
+
+            if content == None:
+                sublime.set_timeout(lambda: self.showRevisionError('File `%s` does not exist in revision %s' % (os.path.basename(path), commit[0:10])), 0)
+            else:
+                sublime.set_timeout(lambda: self.compareToRevision(name, content), 0)
+
+        thread = threading.Thread(target=read)
+        thread.daemon = True
+        thread.start()
+
+    def showRevisionError(self, message):
+        self.active.erase_status('sublimerge-status')
+        sublime.error_message(message)
+
+    def compareToRevision(self, name, content):
+        self.active.erase_status('sublimerge-status')
+        SublimergeDiffThread(self.window, self.active, SublimergeRevision(name, content), self.engine)
+
+    def displayQuickPanel(self, commitStack, callback, more=False):
         self.itemsList = []
         self.commits = []
         for item in commitStack:
@@ -788,9 +2253,14 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
             if len(item['msg']) > 0:
                 line = re.sub('(^\s+)|(\s+$)', '', item['msg'][0])
                 itm.append(line)
+            elif more:
+                itm.append('')
 
             self.itemsList.append(itm)
 
+        if more:
+            self.itemsList.append(['More commits...', 'Load the next %d commits' % (self.logPageSize), ''])
+
         self.window.show_quick_panel(self.itemsList, callback)
 
         self.active.erase_status('sublimerge-status')
@@ -813,26 +2283,6 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
         else:
             return name
 
-    def getFirstDifferentDir(self, a, b):
-        a1 = re.split('[/\\\]', a)
-        a2 = re.split('[/\\\]', b)
-
-        len2 = len(a2) - 1
-
-        for i in range(len(a1)):
-            if i > len2 or a1[i] != a2[i]:
-                return a1[i]
-
-    def sortFiles(self, a, b):
-        d = b['ratio'] - a['ratio']
-
-        if d == 0:
-            return 0
-        if d < 0:
-            return -1
-        if d > 0:
-            return 1
-
     def saved(self, view):
         if view.is_dirty():
             sublime.error_message('File `' + view.file_name() + '` must be saved in order to compare')
@@ -854,8 +2304,251 @@ class SublimergeCommand(sublime_plugin.WindowCommand):
 
                 if self.saved(compareTo):
                     active = self.window.active_view()
-                    active.set_status('sublimerge-computing-diff', 'Computing differences...')
-                    SublimergeDiffThread(self.window, active, compareTo)
+                    SublimergeDiffThread(self.window, active, compareTo, self.engine)
+
+
+class SublimergeDirectoryDiffThread(threading.Thread):
+    hashWorkers = 4
+    chunkSize = 1024 * 1024
+    labels = {
+        '~': 'Modified',
+        '-': 'Only in left directory',
+        '+': 'Only in right directory',
+        'd': 'Directory in left, file in right directory',
+        'f': 'File in left, directory in right directory'
+    }
+
+    def __init__(self, window, left, right, engine=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.window = window
+        self.left = left
+        self.right = right
+        self.engine = engine
+        self.entries = []
+        self.checked = 0
+        self.hashed = 0
+        self.lock = threading.Lock()
+        self.queue = Queue.Queue()
+        self.view = window.active_view()
+
+        self.start()
+        sublime.set_timeout(self.showProgress, 100)
+
+    def showProgress(self):
+        if not self.is_alive():
+            return
+
+        self.lock.acquire()
+        progress = 'Comparing directories... %d files checked, %d hashed, %d differences' % (self.checked, self.hashed, len(self.entries))
+        self.lock.release()
+
+        if self.view != None:
+            self.view.set_status('sublimerge-computing-diff', progress)
+        else:
+            sublime.status_message(progress)
+
+        sublime.set_timeout(self.showProgress, 100)
+
+    def run(self):
+        workers = []
+
+        for i in range(self.hashWorkers):
+            worker = threading.Thread(target=self.hashFiles)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        self.walk()
+
+        for worker in workers:
+            self.queue.put(None)
+
+        for worker in workers:
+            worker.join()
+
+        sublime.set_timeout(self.finish, 0)
+
+    def addEntry(self, change, path):
+        self.lock.acquire()
+        self.entries.append((change, path))
+        self.lock.release()
+
+    def walk(self):
+        stack = ['']
+
+        # each pair of directories is entered once, so symlinks pointing back
+        # up the tree cannot loop - st_ino is 0 on Windows, nothing is tracked
+        visited = set()
+
+        while len(stack) > 0:
+            relative = stack.pop()
+            leftDir = os.path.join(self.left, relative)
+            rightDir = os.path.join(self.right, relative)
+
+            try:
+                if hasattr(os.path, 'samefile') and os.path.samefile(leftDir, rightDir):
+                    continue
+
+                leftStat = os.stat(leftDir)
+                rightStat = os.stat(rightDir)
+                key = (leftStat.st_dev, leftStat.st_ino, rightStat.st_dev, rightStat.st_ino)
+
+                if leftStat.st_ino != 0 and rightStat.st_ino != 0:
+                    if key in visited:
+                        continue
+
+                    visited.add(key)
+
+                leftNames = set(os.listdir(leftDir))
+                rightNames = set(os.listdir(rightDir))
+            except OSError:
+                continue
+
+            for name in leftNames | rightNames:
+                path = os.path.join(relative, name)
+
+                if name not in rightNames:
+                    self.addEntry('-', path)
+                    continue
+                elif name not in leftNames:
+                    self.addEntry('+', path)
+                    continue
+
+                try:
+                    leftStat = os.stat(os.path.join(leftDir, name))
+                    rightStat = os.stat(os.path.join(rightDir, name))
+                except OSError:
+                    continue
+
+                leftIsDir = stat.S_ISDIR(leftStat.st_mode)
+                rightIsDir = stat.S_ISDIR(rightStat.st_mode)
+
+                if leftIsDir and rightIsDir:
+                    stack.append(path)
+                    continue
+                elif leftIsDir:
+                    self.addEntry('d', path)
+                    continue
+                elif rightIsDir:
+                    self.addEntry('f', path)
+                    continue
+
+                self.lock.acquire()
+                self.checked += 1
+                self.lock.release()
+
+                if leftStat.st_size != rightStat.st_size:
+                    self.addEntry('~', path)
+                elif int(leftStat.st_mtime) != int(rightStat.st_mtime):
+                    self.queue.put(path)
+
+    def hashFiles(self):
+        while True:
+            path = self.queue.get()
+
+            if path == None:
+                return
+
+            try:
+                differs = self.hashFile(os.path.join(self.left, path)) != self.hashFile(os.path.join(self.right, path))
+            except (IOError, OSError):
+                differs = True
+
+            self.lock.acquire()
+            self.hashed += 1
+            self.lock.release()
+
+            if differs:
+                self.addEntry('~', path)
+
+    def hashFile(self, path):
+        digest = hashlib.sha1()
+        f = open(path, 'rb')
+
+        try:
+            while True:
+                chunk = f.read(self.chunkSize)
+
+                if chunk == '':
+                    break
+
+                digest.update(chunk)
+        finally:
+            f.close()
+
+        return digest.digest()
+
+    def finish(self):
+        if self.view != None:
+            self.view.erase_status('sublimerge-computing-diff')
+
+        if len(self.entries) == 0:
+            sublime.message_dialog('There is no difference between directories')
+            return
+
+        self.entries.sort(key=lambda entry: entry[1])
+        self.window.show_quick_panel([[path, self.labels[change]] for change, path in self.entries], self.onSelect)
+
+    def onSelect(self, index):
+        if index < 0:
+            return
+
+        change, path = self.entries[index]
+
+        if change == '-' or change == '+':
+            if change == '-':
+                path = os.path.join(self.left, path)
+            else:
+                path = os.path.join(self.right, path)
+
+            if os.path.isdir(path):
+                sublime.status_message('%s is a directory' % (path))
+            else:
+                self.window.open_file(path)
+        elif change == 'd':
+            self.window.open_file(os.path.join(self.right, path))
+        elif change == 'f':
+            self.window.open_file(os.path.join(self.left, path))
+        else:
+            left = self.window.open_file(os.path.join(self.left, path))
+            right = self.window.open_file(os.path.join(self.right, path))
+
+            def compare():
+                if left.is_loading() or right.is_loading():
+                    sublime.set_timeout(compare, 100)
+                else:
+                    SublimergeDiffThread(self.window, left, right, self.engine)
+
+            compare()
+
+
+class SublimergeCompareDirectoriesCommand(sublime_plugin.WindowCommand):
+    def run(self, left=None, right=None, engine=None):
+        self.engine = engine
+
+        if left == None:
+            self.window.show_input_panel('Left directory:', self.defaultDirectory(), lambda left: self.run(left, right, engine), None, None)
+        elif right == None:
+            self.window.show_input_panel('Right directory:', left, lambda right: self.run(left, right, engine), None, None)
+        elif not os.path.isdir(left) or not os.path.isdir(right):
+            sublime.error_message('Both paths must be existing directories')
+        else:
+            SublimergeDirectoryDiffThread(self.window, left, right, self.engine)
+
+    def defaultDirectory(self):
+        folders = self.window.folders()
+
+        if len(folders) > 0:
+            return folders[0]
+
+        view = self.window.active_view()
+
+        if view != None and view.file_name() != None:
+            return os.path.dirname(view.file_name())
+
+        return ''
 
 
 class SublimergeGoUpCommand(sublime_plugin.WindowCommand):
@@ -889,6 +2582,8 @@ class SublimergeListener(sublime_plugin.EventListener):
     def on_load(self, view):
         global diffView
 
+        comparableFiles.invalidate()
+
         if diffView != None:
             if view.id() == diffView.left.id():
                 print "Left file: " + view.file_name()
@@ -898,14 +2593,26 @@ class SublimergeListener(sublime_plugin.EventListener):
                 print "Right file: " + view.file_name()
                 self.right = view
 
-                if diffView.tmpFile != '':
-                    os.remove(diffView.tmpFile)
-
-            if self.left != None and self.right != None:
+            if self.left != None and (self.right != None or diffView.revision != None):
                 diffView.loadDiff()
                 self.left = None
                 self.right = None
 
+    def on_modified(self, view):
+        if diffView != None and (view.id() == diffView.left.id() or view.id() == diffView.right.id()):
+            diffView.textModified(view)
+            diffView.wakeScrollSync()
+
+    def on_selection_modified(self, view):
+        if diffView != None and (view.id() == diffView.left.id() or view.id() == diffView.right.id()):
+            diffView.wakeScrollSync()
+
+    def on_activated(self, view):
+        comparableFiles.activated(view.window())
+
+        if diffView != None and (view.id() == diffView.left.id() or view.id() == diffView.right.id()):
+            diffView.wakeScrollSync()
+
     def on_pre_save(self, view):
         global diffView
 
@@ -919,6 +2626,8 @@ class SublimergeListener(sublime_plugin.EventListener):
     def on_post_save(self, view):
         global diffView
 
+        comparableFiles.invalidate()
+
         if diffView and (view.id() == diffView.left.id() or view.id() == diffView.right.id()):
             wnd = view.window()
             if wnd:
@@ -927,6 +2636,11 @@ class SublimergeListener(sublime_plugin.EventListener):
     def on_close(self, view):
         global diffView
 
+        comparableFiles.invalidate()
+
+        if diffThread != None and view.id() == diffThread.left.id():
+            diffThread.cancel()
+
         if diffView != None:
             if view.id() == diffView.left.id():
                 wnd = diffView.right.window()
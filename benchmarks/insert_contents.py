@@ -0,0 +1,65 @@
+# Measures SublimergeView.insertDiffContents against the stub sublime module
+# and reports the number of editor API calls it makes.
+#
+# Usage: python benchmarks/insert_contents.py [hunks]
+
+import os
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, 'stub'))
+sys.path.insert(1, os.path.dirname(here))
+
+import sublime
+import Sublimerge
+
+
+def generatePair(hunks):
+    left = []
+    right = []
+
+    for i in range(hunks):
+        for j in range(5):
+            line = u'unchanged line %d.%d\n' % (i, j)
+            left.append(line)
+            right.append(line)
+
+        left.append(u'value = %d\n' % i)
+        right.append(u'value = %d + 1\n' % i)
+
+        if i % 3 == 0:
+            right.append(u'added line %d\n' % i)
+
+    return (u''.join(left), u''.join(right))
+
+
+def main():
+    hunks = 5000
+
+    if len(sys.argv) > 1:
+        hunks = int(sys.argv[1])
+
+    text1, text2 = generatePair(hunks)
+    diff = Sublimerge.SublimergeDiffer().hunks(text1, text2)
+
+    window = sublime.active_window()
+    left = sublime.View(window, text1, 'left.txt')
+    right = sublime.View(window, text2, 'right.txt')
+    view = Sublimerge.SublimergeView(window, left, right, diff)
+
+    sublime.reset()
+    started = time.time()
+    view.insertDiffContents(diff)
+    elapsed = time.time() - started
+
+    print 'hunks:      %d' % (len(view.regions))
+    print 'time:       %.3fs' % (elapsed)
+    print 'api calls:  %d' % (sum(sublime.calls.values()))
+
+    for name in sorted(sublime.calls):
+        print '  %-16s %d' % (name, sublime.calls[name])
+
+
+if __name__ == '__main__':
+    main()
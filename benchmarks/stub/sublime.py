@@ -0,0 +1,309 @@
+# Minimal stand-in for Sublime Text 2 API used by benchmarks. Keeps buffers
+# in memory and counts every API call made through views, so a benchmark can
+# report both timings and the number of round trips to the editor.
+
+DRAW_OUTLINED = 2
+HIDDEN = 128
+
+calls = {}
+timeouts = []
+
+
+def count(name):
+    calls[name] = calls.get(name, 0) + 1
+
+
+def reset():
+    calls.clear()
+    del timeouts[:]
+
+
+class Region(object):
+    __slots__ = ['a', 'b']
+
+    def __init__(self, a, b=None):
+        if b == None:
+            b = a
+
+        self.a = a
+        self.b = b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def empty(self):
+        return self.a == self.b
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'Region(%d, %d)' % (self.a, self.b)
+
+
+class Settings(object):
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def add_on_change(self, key, callback):
+        pass
+
+
+class Selection(list):
+    def clear(self):
+        del self[:]
+
+    def add(self, region):
+        self.append(region)
+
+
+class Edit(object):
+    pass
+
+
+class View(object):
+    lastId = 0
+
+    def __init__(self, window=None, text=u'', fileName=None):
+        View.lastId += 1
+        self.viewId = View.lastId
+        self.text = text
+        self.fileName = fileName
+        self.parent = window
+        self.regions = {}
+        self.selection = Selection()
+        self.viewSettings = Settings()
+        self.readOnly = False
+        self.scratch = False
+        self.position = (0.0, 0.0)
+        self.statuses = {}
+        self.history = ('', None, 0)
+
+    def id(self):
+        return self.viewId
+
+    def file_name(self):
+        return self.fileName
+
+    def window(self):
+        return self.parent
+
+    def settings(self):
+        return self.viewSettings
+
+    def size(self):
+        count('size')
+        return len(self.text)
+
+    def substr(self, region):
+        count('substr')
+        return self.text[region.begin():region.end()]
+
+    def begin_edit(self, *args):
+        count('begin_edit')
+        return Edit()
+
+    def end_edit(self, edit):
+        count('end_edit')
+
+    def insert(self, edit, point, text):
+        count('insert')
+        self.text = self.text[:point] + text + self.text[point:]
+        return len(text)
+
+    def erase(self, edit, region):
+        count('erase')
+        self.text = self.text[:region.begin()] + self.text[region.end():]
+
+    def replace(self, edit, region, text):
+        count('replace')
+        self.text = self.text[:region.begin()] + text + self.text[region.end():]
+
+    def add_regions(self, key, regions, *args):
+        count('add_regions')
+        self.regions[key] = list(regions)
+
+    def erase_regions(self, key):
+        count('erase_regions')
+        self.regions.pop(key, None)
+
+    def get_regions(self, key):
+        count('get_regions')
+        return list(self.regions.get(key, []))
+
+    def sel(self):
+        return self.selection
+
+    def set_read_only(self, value):
+        self.readOnly = value
+
+    def is_read_only(self):
+        return self.readOnly
+
+    def set_scratch(self, value):
+        self.scratch = value
+
+    def is_scratch(self):
+        return self.scratch
+
+    def set_name(self, name):
+        pass
+
+    def set_syntax_file(self, syntax):
+        pass
+
+    def is_dirty(self):
+        return False
+
+    def is_loading(self):
+        return False
+
+    def set_status(self, key, value):
+        self.statuses[key] = value
+
+    def erase_status(self, key):
+        self.statuses.pop(key, None)
+
+    def show(self, region, *args):
+        count('show')
+
+    def show_at_center(self, region):
+        count('show_at_center')
+
+    def visible_region(self):
+        return Region(0, min(len(self.text), 4000))
+
+    def viewport_position(self):
+        return self.position
+
+    def set_viewport_position(self, position, animate=True):
+        self.position = position
+
+    def viewport_extent(self):
+        return (800.0, 600.0)
+
+    def layout_extent(self):
+        return (800.0, self.text.count(u'\n') * 16.0)
+
+    def line_height(self):
+        return 16.0
+
+    def rowcol(self, point):
+        row = self.text.count(u'\n', 0, point)
+        return (row, point - self.text.rfind(u'\n', 0, point) - 1)
+
+    def text_point(self, row, col):
+        point = 0
+
+        for i in range(row):
+            point = self.text.find(u'\n', point) + 1
+
+            if point == 0:
+                return len(self.text)
+
+        return point + col
+
+    def text_to_layout(self, point):
+        row, col = self.rowcol(point)
+        return (col * 8.0, row * self.line_height())
+
+    def layout_to_text(self, vector):
+        return self.text_point(int(vector[1] // self.line_height()), 0)
+
+    def command_history(self, index, modifying_only=False):
+        return self.history
+
+    def run_command(self, name, args=None):
+        pass
+
+
+class Window(object):
+    def __init__(self):
+        self.viewsList = []
+        self.panels = []
+
+    def id(self):
+        return 1
+
+    def run_command(self, name, args=None):
+        pass
+
+    def set_layout(self, layout):
+        pass
+
+    def open_file(self, fileName):
+        view = View(self, u'', fileName)
+        self.viewsList.append(view)
+        return view
+
+    def new_file(self):
+        view = View(self)
+        self.viewsList.append(view)
+        return view
+
+    def views(self):
+        return list(self.viewsList)
+
+    def active_view(self):
+        if len(self.viewsList) > 0:
+            return self.viewsList[0]
+
+    def set_view_index(self, view, group, index):
+        pass
+
+    def focus_view(self, view):
+        pass
+
+    def show_quick_panel(self, items, callback, *args):
+        self.panels.append((items, callback))
+
+
+window = Window()
+pluginSettings = Settings()
+
+
+def active_window():
+    return window
+
+
+def windows():
+    return [window]
+
+
+def load_settings(name):
+    return pluginSettings
+
+
+def set_timeout(callback, delay):
+    timeouts.append(callback)
+
+
+def status_message(message):
+    pass
+
+
+def message_dialog(message):
+    pass
+
+
+def error_message(message):
+    pass
+
+
+def packages_path():
+    return ''
@@ -0,0 +1,301 @@
+# Times the diff, render and merge hot paths on synthetic file pairs against
+# the stub sublime module. Every scenario runs in its own process so the peak
+# memory reported for it is not inflated by the ones before.
+#
+# Usage: python benchmarks/suite.py [-o results.json] [-b baseline.json]
+#                                   [-s scenario] [-r repeat] [-t threshold]
+#                                   [--timeout seconds]
+
+import json
+import optparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, 'stub'))
+sys.path.insert(1, os.path.dirname(here))
+
+import sublime
+import Sublimerge
+
+
+def smallEdits(rnd):
+    left = [u'    statement(%d, "%s")\n' % (i, rnd.random()) for i in range(50000)]
+    right = list(left)
+
+    for i in range(20):
+        position = rnd.randrange(len(right))
+        right[position] = u'    changed(%d)\n' % (i)
+
+    return (u''.join(left), u''.join(right))
+
+
+def heavyRefactor(rnd, functions=250):
+    blocks = []
+
+    for i in range(functions):
+        blocks.append([u'def function%d(arg):\n' % (i)] + [u'    value%d = arg * %d\n' % (j, rnd.randint(0, 9)) for j in range(15)] + [u'\n'])
+
+    left = [line for block in blocks for line in block]
+    rnd.shuffle(blocks)
+
+    for block in blocks[0:functions * 3 // 10]:
+        for j in range(1, len(block) - 1):
+            if rnd.random() < 0.3:
+                block[j] = block[j].replace(u'value', u'renamed')
+
+    right = [line for block in blocks for line in block]
+
+    return (u''.join(left), u''.join(right))
+
+
+def largeRefactor(rnd):
+    # 17000 lines, where a Myers search without a cost limit takes minutes
+    return heavyRefactor(rnd, 1000)
+
+
+def longLines(rnd):
+    left = []
+    right = []
+
+    for i in range(200):
+        words = [u'token%d' % (rnd.randint(0, 1000)) for j in range(2500)]
+        left.append(u' '.join(words) + u'\n')
+
+        if i % 4 == 0:
+            for j in range(10):
+                words[rnd.randrange(len(words))] = u'edited'
+
+        right.append(u' '.join(words) + u'\n')
+
+    return (u''.join(left), u''.join(right))
+
+
+def whitespaceChurn(rnd):
+    left = [u'%sline %d\n' % (u' ' * (i % 4 * 4), i) for i in range(20000)]
+    right = []
+
+    for line in left:
+        if rnd.random() < 0.3:
+            line = u'\t' + line.rstrip(u'\n') + u'  \n'
+
+        right.append(line)
+
+    return (u''.join(left), u''.join(right))
+
+
+def tinyHunks(rnd):
+    left = []
+    right = []
+
+    for i in range(30000):
+        left.append(u'line %d\n' % (i))
+
+        if i % 6 == 0:
+            right.append(u'line %d changed\n' % (i))
+        else:
+            right.append(u'line %d\n' % (i))
+
+    return (u''.join(left), u''.join(right))
+
+
+scenarios = [
+    ('small_edits', smallEdits),
+    ('heavy_refactor', heavyRefactor),
+    ('large_refactor', largeRefactor),
+    ('long_lines', longLines),
+    ('whitespace_churn', whitespaceChurn),
+    ('tiny_hunks', tinyHunks)
+]
+
+# settings the scenarios run with, on top of the defaults
+scenarioSettings = {
+    'whitespace_churn': {'ignore_whitespace': True}
+}
+
+singleMerges = 200
+
+
+def best(repeat, prepare, run):
+    times = []
+
+    for i in range(repeat):
+        state = prepare()
+        sublime.reset()
+        started = time.time()
+        run(state)
+        times.append(time.time() - started)
+
+    return min(times)
+
+
+def createView(text1, text2, diff):
+    window = sublime.Window()
+    left = sublime.View(window, text1, 'left.txt')
+    right = sublime.View(window, text2, 'right.txt')
+    view = Sublimerge.SublimergeView(window, left, right, diff)
+
+    return view
+
+
+def insertedView(text1, text2, diff):
+    view = createView(text1, text2, diff)
+    view.insertDiffContents(diff)
+
+    return view
+
+
+def mergeSingle(view):
+    for i in range(min(singleMerges, len(view.regions))):
+        view.selectDiff(0)
+        view.merge('<<', False)
+
+
+def peakMemory():
+    if resource == None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on OS X, kilobytes elsewhere
+    if sys.platform == 'darwin':
+        peak //= 1024
+
+    return peak
+
+
+def runScenario(name, repeat):
+    text1, text2 = dict(scenarios)[name](random.Random(name))
+    result = {}
+
+    Sublimerge.S.s.update(scenarioSettings.get(name, {}))
+
+    for engine in ('myers', 'histogram'):
+        result['hunks_' + engine] = best(repeat, lambda: None, lambda state: Sublimerge.SublimergeDiffer().hunks(text1, text2, engine))
+
+    diff = Sublimerge.SublimergeDiffer().hunks(text1, text2, 'myers')
+
+    result['insert_contents'] = best(repeat, lambda: createView(text1, text2, diff), lambda view: view.insertDiffContents(diff))
+    result['merge_single'] = best(repeat, lambda: insertedView(text1, text2, diff), mergeSingle)
+    result['merge_all'] = best(repeat, lambda: insertedView(text1, text2, diff), lambda view: view.merge('<<', True))
+    result['abandon_unmerged'] = best(repeat, lambda: insertedView(text1, text2, diff), lambda view: view.abandonUnmergedDiffs('left'))
+    result['hunks'] = len(insertedView(text1, text2, diff).regions)
+    result['peak_memory_kb'] = peakMemory()
+
+    return result
+
+
+def runChild(name, repeat, timeout):
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--run-scenario', name, '--repeat', str(repeat)], stdout=subprocess.PIPE)
+    killed = []
+
+    def kill():
+        killed.append(True)
+        process.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    output = process.communicate()[0]
+    timer.cancel()
+
+    if len(killed) > 0:
+        return {'timed_out': timeout}
+
+    return json.loads(output)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+
+    for name in sorted(results['scenarios']):
+        if name not in baseline['scenarios']:
+            continue
+
+        current = results['scenarios'][name]
+        previous = baseline['scenarios'][name]
+
+        if 'timed_out' in current:
+            print '%-18s timed out after %ds  REGRESSION' % (name, current['timed_out'])
+            regressions.append((name, 'timed_out'))
+            continue
+
+        for metric in sorted(current):
+            if metric == 'hunks' or current[metric] == None or previous.get(metric) == None:
+                continue
+
+            change = 0.0
+
+            if previous[metric] > 0:
+                change = float(current[metric] - previous[metric]) / previous[metric]
+
+            flag = ''
+
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((name, metric))
+
+            print '%-18s %-22s %12.4f %12.4f %+7.1f%%%s' % (name, metric, previous[metric], current[metric], change * 100, flag)
+
+    return regressions
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-o', '--output', metavar='FILE', help='write results as JSON to FILE')
+    parser.add_option('-b', '--baseline', metavar='FILE', help='compare results with a previous JSON output')
+    parser.add_option('-s', '--scenario', action='append', help='run only this scenario (repeatable)')
+    parser.add_option('-r', '--repeat', type='int', default=3, help='runs per measurement, the best one is kept')
+    parser.add_option('-t', '--threshold', type='float', default=0.1, help='relative slowdown reported as a regression')
+    parser.add_option('--timeout', type='float', default=300, help='seconds a scenario may take before it is killed and reported as a regression')
+    parser.add_option('--run-scenario', help=optparse.SUPPRESS_HELP)
+    options, args = parser.parse_args()
+
+    if options.run_scenario != None:
+        sys.stdout.write(json.dumps(runScenario(options.run_scenario, options.repeat)))
+        return 0
+
+    names = options.scenario or [name for name, generate in scenarios]
+    results = {'python': sys.version.split()[0], 'platform': sys.platform, 'repeat': options.repeat, 'scenarios': {}}
+
+    for name in names:
+        if name not in dict(scenarios):
+            parser.error('unknown scenario: %s' % (name))
+
+        results['scenarios'][name] = runChild(name, options.repeat, options.timeout)
+
+        print '%s:' % (name)
+
+        for metric in sorted(results['scenarios'][name]):
+            print '  %-22s %s' % (metric, results['scenarios'][name][metric])
+
+    if options.output != None:
+        f = open(options.output, 'w')
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+
+    if options.baseline != None:
+        f = open(options.baseline)
+        baseline = json.load(f)
+        f.close()
+
+        print
+        regressions = compare(results, baseline, options.threshold)
+
+        if len(regressions) > 0:
+            print '%d regression(s) over %d%%' % (len(regressions), options.threshold * 100)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,842 @@
+ # Copyright (c) 2012 Borys Forytarz <borys.forytarz@gmail.com>
+ #
+ # Permission is hereby granted, free of charge, to any person
+ # obtaining a copy of this software and associated documentation files
+ # (the "Software"), to deal in the Software without restriction,
+ # including without limitation the rights to use, copy, modify,
+ # merge, publish, distribute, sublicense, and/or sell copies of the
+ # Software, and to permit persons to whom the Software is furnished
+ # to do so, subject to the following conditions:
+ #
+ # The above copyright notice and this permission notice shall be
+ # included in all copies or substantial portions of the Software.
+ #
+ # THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+ # EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+ # MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+ # NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+ # BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+ # ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+ # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ # SOFTWARE.
+ #
+ # https://github.com/borysf/Sublimerge
+
+
+import difflib
+import re
+import sys
+import json
+import optparse
+from array import array
+
+
+class SublimergeMyersMatcher():
+    """Linear space variant of Myers' O(ND) difference algorithm.
+
+    Mimics the part of difflib.SequenceMatcher interface used by
+    SublimergeDiffer (get_matching_blocks and get_opcodes).
+
+    A region whose edit distance exceeds the cost limit is not diffed
+    minimally but anchored on its rarest lines, like the histogram engine
+    does (the same idea as GNU diff's "too expensive" heuristic). This keeps
+    heavily reordered files from taking quadratic time.
+    """
+
+    anchored = False
+    maxChainLength = 64
+    minCost = 64
+
+    def __init__(self, a, b, monitor=None):
+        self.a = a
+        self.b = b
+        self.monitor = monitor
+        self.matchingBlocks = None
+
+    def advance(self, lines):
+        if self.monitor != None:
+            self.monitor.advance(lines)
+
+    def commonPrefix(self, aLo, aHi, bLo, bHi):
+        a = self.a
+        b = self.b
+        n = 0
+
+        while aLo + n < aHi and bLo + n < bHi and a[aLo + n] == b[bLo + n]:
+            n += 1
+
+        return n
+
+    def commonSuffix(self, aLo, aHi, bLo, bHi):
+        a = self.a
+        b = self.b
+        n = 0
+
+        while aHi - n > aLo and bHi - n > bLo and a[aHi - n - 1] == b[bHi - n - 1]:
+            n += 1
+
+        return n
+
+    def middleSnake(self, aLo, aHi, bLo, bHi):
+        a = self.a
+        b = self.b
+        N = aHi - aLo
+        M = bHi - bLo
+        delta = N - M
+        odd = delta & 1
+        maxD = (N + M + 1) // 2
+        costLimit = max(self.minCost, int((N + M) ** 0.5))
+        offset = maxD + 1
+        vf = [0] * (2 * offset + 1)
+        vb = [0] * (2 * offset + 1)
+
+        for d in range(maxD + 1):
+            if d > costLimit:
+                return None
+
+            if self.monitor != None:
+                self.monitor.check()
+
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and vf[offset + k - 1] < vf[offset + k + 1]):
+                    x = vf[offset + k + 1]
+                else:
+                    x = vf[offset + k - 1] + 1
+
+                y = x - k
+                xStart = x
+                yStart = y
+
+                while x < N and y < M and a[aLo + x] == b[bLo + y]:
+                    x += 1
+                    y += 1
+
+                vf[offset + k] = x
+
+                if odd and delta - d < k < delta + d and x + vb[offset + delta - k] >= N:
+                    return (xStart, yStart, x, y)
+
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and vb[offset + k - 1] < vb[offset + k + 1]):
+                    x = vb[offset + k + 1]
+                else:
+                    x = vb[offset + k - 1] + 1
+
+                y = x - k
+                xStart = x
+                yStart = y
+
+                while x < N and y < M and a[aHi - x - 1] == b[bHi - y - 1]:
+                    x += 1
+                    y += 1
+
+                vb[offset + k] = x
+
+                if not odd and -d <= delta - k <= d and x + vf[offset + delta - k] >= N:
+                    return (N - x, M - y, N - xStart, M - yStart)
+
+        return (0, 0, 0, 0)
+
+    def get_matching_blocks(self):
+        if self.matchingBlocks != None:
+            return self.matchingBlocks
+
+        a = self.a
+        b = self.b
+        blocks = []
+
+        # lines that do not occur in the other file can never match, so
+        # they are dropped before searching - this keeps large one-sided
+        # changes from hitting the quadratic worst case
+        indexA, indexB = self.discardUnmatched()
+
+        if indexA != None:
+            self.a = [a[i] for i in indexA]
+            self.b = [b[j] for j in indexB]
+
+            try:
+                self.findBlocks(0, len(self.a), 0, len(self.b), blocks)
+            finally:
+                self.a = a
+                self.b = b
+
+            blocks = self.restoreBlocks(blocks, indexA, indexB)
+        else:
+            self.findBlocks(0, len(a), 0, len(b), blocks)
+
+        self.matchingBlocks = self.mergeBlocks(blocks)
+
+        return self.matchingBlocks
+
+    def discardUnmatched(self):
+        inB = dict.fromkeys(self.b)
+        indexA = [i for i in range(len(self.a)) if self.a[i] in inB]
+        inA = dict.fromkeys(self.a[i] for i in indexA)
+        indexB = [j for j in range(len(self.b)) if self.b[j] in inA]
+
+        discarded = len(self.a) - len(indexA) + len(self.b) - len(indexB)
+
+        if discarded == 0:
+            return (None, None)
+
+        self.advance(discarded)
+
+        return (indexA, indexB)
+
+    def restoreBlocks(self, blocks, indexA, indexB):
+        restored = []
+
+        for i, j, size in blocks:
+            for k in range(size):
+                restored.append((indexA[i + k], indexB[j + k], 1))
+
+        return restored
+
+    def findBlocks(self, aLo, aHi, bLo, bHi, blocks):
+        stack = [(aLo, aHi, bLo, bHi, self.anchored)]
+
+        while len(stack) > 0:
+            aLo, aHi, bLo, bHi, anchored = stack.pop()
+
+            prefix = self.commonPrefix(aLo, aHi, bLo, bHi)
+            if prefix > 0:
+                blocks.append((aLo, bLo, prefix))
+                aLo += prefix
+                bLo += prefix
+
+            suffix = self.commonSuffix(aLo, aHi, bLo, bHi)
+            if suffix > 0:
+                blocks.append((aHi - suffix, bHi - suffix, suffix))
+                aHi -= suffix
+                bHi -= suffix
+
+            self.advance(2 * (prefix + suffix))
+
+            if aLo == aHi or bLo == bHi:
+                self.advance(aHi - aLo + bHi - bLo)
+                continue
+
+            if anchored:
+                if self.monitor != None:
+                    self.monitor.check()
+
+                anchor = self.findAnchor(aLo, aHi, bLo, bHi)
+
+                if anchor == False:
+                    self.advance(aHi - aLo + bHi - bLo)
+                    continue
+
+                if anchor != None:
+                    i, j, size = anchor
+                    blocks.append(anchor)
+                    self.advance(2 * size)
+
+                    stack.append((i + size, aHi, j + size, bHi, True))
+                    stack.append((aLo, i, bLo, j, True))
+                    continue
+
+            snake = self.middleSnake(aLo, aHi, bLo, bHi)
+
+            if snake == None:
+                if not anchored:
+                    stack.append((aLo, aHi, bLo, bHi, True))
+                    continue
+
+                # too expensive and nothing rare enough to anchor on,
+                # split in the middle and go on with both halves
+                i = (aLo + aHi) // 2
+                j = (bLo + bHi) // 2
+
+                stack.append((i, aHi, j, bHi, True))
+                stack.append((aLo, i, bLo, j, True))
+                continue
+
+            x1, y1, x2, y2 = snake
+
+            if x2 > x1:
+                blocks.append((aLo + x1, bLo + y1, x2 - x1))
+
+            self.advance(2 * (x2 - x1))
+
+            stack.append((aLo + x2, aHi, bLo + y2, bHi, False))
+            stack.append((aLo, aLo + x1, bLo, bLo + y1, False))
+
+    def findAnchor(self, aLo, aHi, bLo, bHi):
+        a = self.a
+        b = self.b
+        occurrences = {}
+
+        for i in range(aLo, aHi):
+            positions = occurrences.get(a[i])
+
+            if positions == None:
+                occurrences[a[i]] = [i]
+            else:
+                positions.append(i)
+
+        best = None
+        bestCount = self.maxChainLength + 1
+        common = False
+        j = bLo
+
+        while j < bHi:
+            positions = occurrences.get(b[j])
+
+            if positions == None:
+                j += 1
+                continue
+
+            common = True
+
+            if len(positions) > self.maxChainLength:
+                j += 1
+                continue
+
+            nextJ = j + 1
+
+            for i in positions:
+                if i >= aHi:
+                    break
+
+                count = len(positions)
+                s = 0
+                while i - s > aLo and j - s > bLo and a[i - s - 1] == b[j - s - 1]:
+                    s += 1
+                    count = min(count, len(occurrences[a[i - s]]))
+
+                e = 1
+                while i + e < aHi and j + e < bHi and a[i + e] == b[j + e]:
+                    count = min(count, len(occurrences[a[i + e]]))
+                    e += 1
+
+                size = s + e
+
+                if count < bestCount or (count == bestCount and size > best[2]):
+                    best = (i - s, j - s, size)
+                    bestCount = count
+
+                nextJ = max(nextJ, j + e)
+
+            j = nextJ
+
+        if not common:
+            return False
+
+        return best
+
+    def mergeBlocks(self, blocks):
+        blocks.sort()
+
+        merged = []
+        for block in blocks:
+            if len(merged) > 0:
+                last = merged[len(merged) - 1]
+                if last[0] + last[2] == block[0] and last[1] + last[2] == block[1]:
+                    merged[len(merged) - 1] = (last[0], last[1], last[2] + block[2])
+                    continue
+
+            merged.append(block)
+
+        merged.append((len(self.a), len(self.b), 0))
+
+        return merged
+
+    def get_opcodes(self):
+        i = j = 0
+        opcodes = []
+
+        for ai, bj, size in self.get_matching_blocks():
+            tag = ''
+
+            if i < ai and j < bj:
+                tag = 'replace'
+            elif i < ai:
+                tag = 'delete'
+            elif j < bj:
+                tag = 'insert'
+
+            if tag:
+                opcodes.append((tag, i, ai, j, bj))
+
+            i = ai + size
+            j = bj + size
+
+            if size:
+                opcodes.append(('equal', ai, i, bj, j))
+
+        return opcodes
+
+
+class SublimergeHistogramMatcher(SublimergeMyersMatcher):
+    """Histogram (patience-like) difference algorithm.
+
+    Anchors each region on the longest common run containing the least
+    frequent line, then recurses on both sides of the anchor. Regions
+    without any usable anchor are handed to the Myers algorithm, regions
+    without any common line are left unmatched.
+    """
+
+    anchored = True
+
+
+class SublimergeEqual(object):
+    """Unchanged block, lines i1:i2 of the left text and j1:j2 of the right
+    one. Only the character range in the left text is kept, the text itself
+    is sliced out of it when asked for.
+    """
+
+    __slots__ = ['source', 'begin', 'end', 'i1', 'i2', 'j1', 'j2']
+
+    def __init__(self, source, begin, end, i1, i2, j1, j2):
+        self.source = source
+        self.begin = begin
+        self.end = end
+        self.i1 = i1
+        self.i2 = i2
+        self.j1 = j1
+        self.j2 = j2
+
+    def text(self):
+        return self.source[self.begin:self.end]
+
+    def asDict(self):
+        return self.text()
+
+
+class SublimergeHunk(object):
+    """Difference between lines i1:i2 of the left text and j1:j2 of the
+    right one, kept as character ranges of both texts.
+    """
+
+    __slots__ = ['text1', 'text2', 'begin1', 'end1', 'begin2', 'end2', 'i1', 'i2', 'j1', 'j2', 'change', 'intraline']
+
+    def __init__(self, text1, text2, begin1, end1, begin2, end2, i1, i2, j1, j2, change, intraline):
+        self.text1 = text1
+        self.text2 = text2
+        self.begin1 = begin1
+        self.end1 = end1
+        self.begin2 = begin2
+        self.end2 = end2
+        self.i1 = i1
+        self.i2 = i2
+        self.j1 = j1
+        self.j2 = j2
+        self.change = change
+        self.intraline = intraline
+
+    def minus(self):
+        return self.text1[self.begin1:self.end1]
+
+    def plus(self):
+        return self.text2[self.begin2:self.end2]
+
+    def asDict(self):
+        return {'-': self.minus(), '+': self.plus(), 'change': self.change, 'intraline': self.intraline, 'intralines': {'+': [], '-': []}}
+
+
+class SublimergeDiffer():
+    trimmedLines = 0
+    trimRe = re.compile('(^\s+)|(\s+$)')
+    trimLinesRe = re.compile('(^\s+)|(\s+$)', re.MULTILINE)
+
+    engines = {
+        'myers': SublimergeMyersMatcher,
+        'histogram': SublimergeHistogramMatcher
+    }
+
+    # (change, intraline) of matcher opcodes, difflib ones come as such pairs
+    hunkTags = {
+        'delete': ('-', ''),
+        'insert': ('+', ''),
+        'replace': ('-', '!')
+    }
+
+    def difference(self, text1, text2, engine='myers', monitor=None):
+        return [part.asDict() for part in self.hunks(text1, text2, engine, monitor)]
+
+    def load(self, diff):
+        """Rebuilds hunks from difference() output, like the 'diff' lists the
+        command line writes. Hunks that are built already are kept.
+        """
+        data = []
+        i = j = 0
+
+        for part in diff:
+            if isinstance(part, dict):
+                minus = part['-']
+                plus = part['+']
+                i2 = i + len(minus.splitlines(1))
+                j2 = j + len(plus.splitlines(1))
+                part = SublimergeHunk(minus, plus, 0, len(minus), 0, len(plus), i, i2, j, j2, part['change'], part['intraline'])
+            elif not isinstance(part, (SublimergeEqual, SublimergeHunk)):
+                size = len(part.splitlines(1))
+                part = SublimergeEqual(part, 0, len(part), i, i + size, j, j + size)
+
+            data.append(part)
+            i = part.i2
+            j = part.j2
+
+        return data
+
+    def hunks(self, text1, text2, engine='myers', monitor=None):
+        lines1 = text1.splitlines(1)
+        lines2 = text2.splitlines(1)
+
+        prefix, suffix = self.commonEnds(lines1, lines2)
+        self.trimmedLines = prefix + suffix
+
+        if monitor != None:
+            monitor.begin(len(lines1) + len(lines2))
+            monitor.advance(2 * self.trimmedLines)
+
+        end1 = len(lines1) - suffix
+        end2 = len(lines2) - suffix
+
+        if engine == 'difflib':
+            opcodes = self.differOpcodes(lines1[prefix:end1], lines2[prefix:end2], monitor)
+        else:
+            a, b = self.internLines(lines1[prefix:end1], lines2[prefix:end2])
+            opcodes = self.engines.get(engine, SublimergeMyersMatcher)(a, b, monitor).get_opcodes()
+
+        if prefix > 0:
+            opcodes.insert(0, ('equal', -prefix, 0, -prefix, 0))
+
+        if suffix > 0:
+            opcodes.append(('equal', end1 - prefix, len(lines1) - prefix, end2 - prefix, len(lines2) - prefix))
+
+        # parts are cut out of the texts by character offsets
+        sizes1 = map(len, lines1)
+        sizes2 = map(len, lines2)
+        data = []
+        pos1 = pos2 = 0
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            i1 += prefix
+            i2 += prefix
+            j1 += prefix
+            j2 += prefix
+
+            if tag == 'equal':
+                size = sum(sizes1[i1:i2])
+                data.append(SublimergeEqual(text1, pos1, pos1 + size, i1, i2, j1, j2))
+                pos1 += size
+                pos2 += size
+                continue
+
+            begin1 = pos1
+            begin2 = pos2
+            pos1 += sum(sizes1[i1:i2])
+            pos2 += sum(sizes2[j1:j2])
+            change, intraline = self.hunkTags.get(tag, tag)
+
+            data.append(SublimergeHunk(text1, text2, begin1, pos1, begin2, pos2, i1, i2, j1, j2, change, intraline))
+
+        return data
+
+    def differs(self, text1, text2, ignoreWhitespace=False):
+        if ignoreWhitespace:
+            return self.trimLinesRe.sub('', text1) != self.trimLinesRe.sub('', text2)
+
+        return text1 != text2
+
+    def whitespaceOnly(self, part):
+        return self.trimRe.sub('', part.plus()) == self.trimRe.sub('', part.minus())
+
+    def commonEnds(self, lines1, lines2):
+        length = min(len(lines1), len(lines2))
+        prefix = 0
+
+        while prefix < length and lines1[prefix] == lines2[prefix]:
+            prefix += 1
+
+        length -= prefix
+        suffix = 0
+
+        while suffix < length and lines1[-suffix - 1] == lines2[-suffix - 1]:
+            suffix += 1
+
+        return (prefix, suffix)
+
+    def internLines(self, lines1, lines2):
+        ids = {}
+        a = array('i', [ids.setdefault(line, len(ids)) for line in lines1])
+        b = array('i', [ids.setdefault(line, len(ids)) for line in lines2])
+
+        return (a, b)
+
+    def differOpcodes(self, lines1, lines2, monitor=None):
+        # parts only count lines: an int for unchanged lines, a list of
+        # [removed, added, change, intraline] for a hunk. Hunks come out
+        # tagged with a (change, intraline) tuple
+        data = []
+        lines = []
+
+        # Differ yields its lines as it goes, so progress and cancelling
+        # follow it line by line
+        for line in difflib.Differ().compare(lines1, lines2):
+            lines.append(line)
+
+            if monitor != None and line[0] != '?':
+                monitor.advance(line[0] == ' ' and 2 or 1)
+
+        for i in range(len(lines)):
+            line = lines[i]
+            lastIdx = len(data) - 1
+            change = line[0]
+
+            part = None
+
+            if change == '+':
+                part = [0, 1, '+', '']
+
+            elif change == '-':
+                part = [1, 0, '-', '']
+
+            elif change == ' ':
+                part = 1
+
+            elif change == '?':
+                continue
+
+            if isinstance(part, int) and lastIdx >= 0 and isinstance(data[lastIdx], int):
+                data[lastIdx] += part
+            else:
+                if isinstance(part, list):
+                    if i < len(lines) - 1 and lines[i + 1][0] == '?':
+                        part[3] = change
+
+                    if lastIdx >= 0:
+                        last = data[lastIdx]
+                    else:
+                        last = None
+
+                    if isinstance(last, list):
+                        skip = False
+
+                        im_p = last[3] == '-' and part[2] == '+'
+                        im_ip = last[3] == '-' and part[3] == '+'
+                        m_ip = last[2] == '-' and part[3] == '+'
+
+                        if im_p or im_ip or m_ip:
+                            last[0] += part[0]
+                            last[1] += part[1]
+                            last[3] = '!'
+                            skip = True
+                        elif part[3] == '' and last[3] == '':
+                            nextIntraline = None
+                            if i < len(lines) - 2 and lines[i + 2][0] == '?':
+                                nextIntraline = lines[i + 1][0]
+
+                            if nextIntraline == '+' and part[2] == '-':
+                                data.append(part)
+                                skip = True
+                            else:
+                                last[0] += part[0]
+                                last[1] += part[1]
+                                skip = True
+
+                        if not skip:
+                            data.append(part)
+                    else:
+                        data.append(part)
+                else:
+                    data.append(part)
+
+        opcodes = []
+        i = j = 0
+
+        for part in data:
+            if isinstance(part, int):
+                opcodes.append(('equal', i, i + part, j, j + part))
+                i += part
+                j += part
+            else:
+                opcodes.append(((part[2], part[3]), i, i + part[0], j, j + part[1]))
+                i += part[0]
+                j += part[1]
+
+        return opcodes
+
+
+class SublimergeTooExpensive(Exception):
+    pass
+
+
+class SublimergeIntralineDiffer():
+    tokenRe = re.compile('\n|[^\S\n]+|\w+|[^\w\s]', re.UNICODE)
+
+    # the token diff runs on the UI thread, above these limits whole lines
+    # are marked instead
+    maxTokens = 3000
+    maxSteps = 200
+
+    def difference(self, text1, text2, maxLength=10000):
+        offsets = {'+': [], '-': []}
+
+        if len(text1) + len(text2) > maxLength:
+            return self.wholeLines(text1, text2)
+
+        tokens1, starts1 = self.tokenize(text1)
+        tokens2, starts2 = self.tokenize(text2)
+
+        if len(tokens1) + len(tokens2) > self.maxTokens:
+            return self.wholeLines(text1, text2)
+
+        self.steps = 0
+
+        try:
+            opcodes = SublimergeMyersMatcher(tokens1, tokens2, self).get_opcodes()
+        except SublimergeTooExpensive:
+            return self.wholeLines(text1, text2)
+
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                continue
+
+            self.addOffsets(offsets['-'], tokens1, starts1, i1, i2)
+            self.addOffsets(offsets['+'], tokens2, starts2, j1, j2)
+
+        return offsets
+
+    def check(self):
+        # called by the matcher for every step of its search
+        self.steps += 1
+
+        if self.steps > self.maxSteps:
+            raise SublimergeTooExpensive()
+
+    def advance(self, tokens):
+        pass
+
+    def wholeLines(self, text1, text2):
+        return {'-': self.lineOffsets(text1), '+': self.lineOffsets(text2)}
+
+    def tokenize(self, text):
+        tokens = []
+        starts = []
+
+        for m in self.tokenRe.finditer(text):
+            tokens.append(m.group(0))
+            starts.append(m.start())
+
+        starts.append(len(text))
+
+        return (tokens, starts)
+
+    def addOffsets(self, offsets, tokens, starts, lo, hi):
+        for i in range(lo, hi):
+            if tokens[i] == '\n':
+                continue
+
+            if len(offsets) > 0 and offsets[len(offsets) - 1][1] == starts[i]:
+                offsets[len(offsets) - 1][1] = starts[i + 1]
+            else:
+                offsets.append([starts[i], starts[i + 1]])
+
+    def lineOffsets(self, text):
+        offsets = []
+        begin = 0
+
+        for line in text.split('\n'):
+            if line != '':
+                offsets.append([begin, begin + len(line)])
+
+            begin += len(line) + 1
+
+        return offsets
+
+
+class SublimergeBatch():
+    """Diffs file pairs from the command line and writes one JSON object
+    per pair, in input order. The 'diff' list is difference() output,
+    SublimergeDiffer.load() turns it back into the hunks
+    SublimergeView.insertDiffContents consumes.
+    """
+
+    def __init__(self, engine='myers', ignoreWhitespace=False):
+        self.engine = engine
+        self.ignoreWhitespace = ignoreWhitespace
+
+    def read(self, path):
+        f = open(path, 'rb')
+
+        try:
+            return f.read().decode('utf-8', 'replace').replace(u'\r\n', u'\n')
+        finally:
+            f.close()
+
+    def __call__(self, pair):
+        result = {'left': pair[0], 'right': pair[1]}
+
+        try:
+            text1 = self.read(pair[0])
+            text2 = self.read(pair[1])
+        except (IOError, OSError), e:
+            result['error'] = str(e)
+            return json.dumps(result)
+
+        differ = SublimergeDiffer()
+        result['differs'] = differ.differs(text1, text2, self.ignoreWhitespace)
+        result['diff'] = differ.difference(text1, text2, self.engine)
+
+        return json.dumps(result)
+
+    def pairs(self, args, pairsFile):
+        if len(args) % 2 != 0:
+            raise ValueError('files must be given in pairs')
+
+        for i in range(0, len(args), 2):
+            yield (args[i], args[i + 1])
+
+        if pairsFile != None:
+            if pairsFile == '-':
+                f = sys.stdin
+            else:
+                f = open(pairsFile, 'rb')
+
+            for line in f:
+                line = line.rstrip('\r\n')
+
+                if line != '':
+                    fields = line.split('\t')
+
+                    if len(fields) != 2:
+                        raise ValueError('expected two tab separated paths: %r' % (line))
+
+                    yield (fields[0], fields[1])
+
+    def run(self, argv):
+        import multiprocessing
+
+        parser = optparse.OptionParser(usage='%prog [options] [LEFT RIGHT ...]')
+        parser.add_option('-e', '--engine', default='myers', choices=['myers', 'histogram', 'difflib'], help='diff engine: myers, histogram or difflib')
+        parser.add_option('-w', '--ignore-whitespace', action='store_true', default=False, help='treat whitespace-only changes as no difference')
+        parser.add_option('-p', '--pairs', metavar='FILE', help='read tab separated file pairs from FILE (- for stdin)')
+        parser.add_option('-j', '--jobs', type='int', default=multiprocessing.cpu_count(), help='number of worker processes')
+        options, args = parser.parse_args(argv)
+
+        self.engine = options.engine
+        self.ignoreWhitespace = options.ignore_whitespace
+
+        try:
+            pairs = list(self.pairs(args, options.pairs))
+        except (ValueError, IOError), e:
+            parser.error(str(e))
+
+        if options.jobs > 1 and len(pairs) > 1:
+            pool = multiprocessing.Pool(options.jobs)
+            results = pool.imap(self, pairs)
+        else:
+            pool = None
+            results = (self(pair) for pair in pairs)
+
+        for line in results:
+            sys.stdout.write(line + '\n')
+
+        if pool != None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    SublimergeBatch().run(sys.argv[1:])
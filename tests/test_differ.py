@@ -0,0 +1,287 @@
+# Checks the diff engines of sublimerge_core on random file pairs: hunk lists
+# have to rebuild both texts, Myers has to find a longest common subsequence
+# and the difflib engine has to give what the original Differ based
+# SublimergeDiffer gave.
+#
+# Usage: python -m unittest discover -s tests
+
+import difflib
+import json
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sublimerge_core import SublimergeDiffer, SublimergeMyersMatcher, SublimergeEqual, SublimergeHunk, SublimergeIntralineDiffer
+
+vocabulary = [u'a\n', u'b\n', u'foo bar\n', u'  foo bar\n', u'{\n', u'}\n', u'\n', u'x = 1\n', u'x = 2\n', u'return x\n']
+
+
+def randomPairs(count, seed):
+    rnd = random.Random(seed)
+    pairs = []
+
+    for i in range(count):
+        text1 = u''.join([rnd.choice(vocabulary) for j in range(rnd.randint(0, 40))])
+        text2 = u''.join([rnd.choice(vocabulary) for j in range(rnd.randint(0, 40))])
+
+        if i % 5 == 0:
+            text2 = text2.rstrip(u'\n')
+
+        if i % 7 == 0:
+            text1 += u'no newline'
+
+        pairs.append((text1, text2))
+
+    return pairs
+
+
+def originalDifference(text1, text2):
+    # SublimergeDiffer.difference as it was before the engines were added
+    data = []
+    lines = list(difflib.Differ().compare(text1.splitlines(1), text2.splitlines(1)))
+
+    for i in range(len(lines)):
+        line = lines[i]
+        lastIdx = len(data) - 1
+        change = line[0]
+        line = line[2:len(line)]
+
+        part = None
+
+        if change == '+':
+            part = {'+': line, '-': '', 'change': '+', 'intraline': '', 'intralines': {'+': [], '-': []}}
+
+        elif change == '-':
+            part = {'-': line, '+': '', 'change': '-', 'intraline': '', 'intralines': {'+': [], '-': []}}
+
+        elif change == ' ':
+            part = line
+
+        elif change == '?':
+            continue
+
+        if isinstance(part, str) and isinstance(data[lastIdx], str):
+            data[lastIdx] += part
+        else:
+            if isinstance(part, dict):
+                if i < len(lines) - 1 and lines[i + 1][0] == '?':
+                    part['intraline'] = change
+
+                if lastIdx >= 0:
+                    last = data[lastIdx]
+                else:
+                    last = None
+
+                if isinstance(last, dict):
+                    skip = False
+
+                    im_p = last['intraline'] == '-' and part['change'] == '+'
+                    im_ip = last['intraline'] == '-' and part['intraline'] == '+'
+                    m_ip = last['change'] == '-' and part['intraline'] == '+'
+
+                    if im_p or im_ip or m_ip:
+                        data[lastIdx]['+'] += part['+']
+                        data[lastIdx]['-'] += part['-']
+                        data[lastIdx]['intraline'] = '!'
+                        skip = True
+                    elif part['intraline'] == '' and last['intraline'] == '':
+                        nextIntraline = None
+                        if i < len(lines) - 2 and lines[i + 2][0] == '?':
+                            nextIntraline = lines[i + 1][0]
+
+                        if nextIntraline == '+' and part['change'] == '-':
+                            data.append(part)
+                            skip = True
+                        else:
+                            data[lastIdx]['+'] += part['+']
+                            data[lastIdx]['-'] += part['-']
+                            skip = True
+
+                    if not skip:
+                        data.append(part)
+                else:
+                    data.append(part)
+            else:
+                data.append(part)
+
+    return data
+
+
+def joinUnchanged(diff):
+    joined = []
+
+    for part in diff:
+        if not isinstance(part, dict) and len(joined) > 0 and not isinstance(joined[len(joined) - 1], dict):
+            joined[len(joined) - 1] += part
+        else:
+            joined.append(part)
+
+    return joined
+
+
+def lcsLength(a, b):
+    previous = [0] * (len(b) + 1)
+
+    for i in range(len(a)):
+        current = [0] * (len(b) + 1)
+
+        for j in range(len(b)):
+            if a[i] == b[j]:
+                current[j + 1] = previous[j] + 1
+            else:
+                current[j + 1] = max(previous[j + 1], current[j])
+
+        previous = current
+
+    return previous[len(b)]
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Monitor():
+    # counts the lines the engines report and cancels after cancelAfter
+    def __init__(self, cancelAfter=None):
+        self.cancelAfter = cancelAfter
+        self.total = 0
+        self.done = 0
+
+    def begin(self, total):
+        self.total = total
+
+    def advance(self, lines):
+        self.done += lines
+        self.check()
+
+    def check(self):
+        if self.cancelAfter != None and self.done >= self.cancelAfter:
+            raise Cancelled()
+
+
+class DifferTest(unittest.TestCase):
+    engines = ['myers', 'histogram', 'difflib']
+
+    def assertRebuilds(self, text1, text2, diff):
+        lines2 = text2.splitlines(1)
+        left = []
+        right = []
+        i = j = 0
+
+        for part in diff:
+            self.assertEqual((part.i1, part.j1), (i, j))
+
+            if isinstance(part, SublimergeEqual):
+                self.assertEqual(part.text(), u''.join(lines2[part.j1:part.j2]))
+                left.append(part.text())
+                right.append(part.text())
+            else:
+                self.assertTrue(isinstance(part, SublimergeHunk))
+                self.assertTrue(part.i2 > part.i1 or part.j2 > part.j1)
+                left.append(part.minus())
+                right.append(part.plus())
+
+            i = part.i2
+            j = part.j2
+
+        self.assertEqual(u''.join(left), text1)
+        self.assertEqual(u''.join(right), text2)
+
+    def testHunksRebuildBothTexts(self):
+        for text1, text2 in randomPairs(300, 1):
+            for engine in self.engines:
+                self.assertRebuilds(text1, text2, SublimergeDiffer().hunks(text1, text2, engine))
+
+    def testCostlyRegionsRebuildBothTexts(self):
+        # reordered lines from a tiny vocabulary exceed the Myers cost
+        # limit and leave nothing rare to anchor on
+        rnd = random.Random(2)
+        lines = [rnd.choice(vocabulary[0:3]) for i in range(3000)]
+        text1 = u''.join(lines)
+        rnd.shuffle(lines)
+        text2 = u''.join(lines)
+
+        for engine in ('myers', 'histogram'):
+            self.assertRebuilds(text1, text2, SublimergeDiffer().hunks(text1, text2, engine))
+
+    def testMyersFindsLongestCommonSubsequence(self):
+        for text1, text2 in randomPairs(300, 3):
+            a = text1.splitlines(1)
+            b = text2.splitlines(1)
+            blocks = SublimergeMyersMatcher(a, b).get_matching_blocks()
+
+            for i, j, size in blocks:
+                self.assertEqual(a[i:i + size], b[j:j + size])
+
+            self.assertEqual(sum([size for i, j, size in blocks]), lcsLength(a, b))
+
+    def testLoadRebuildsCommandLineOutput(self):
+        differ = SublimergeDiffer()
+
+        for text1, text2 in randomPairs(300, 6):
+            for engine in self.engines:
+                diff = json.loads(json.dumps(differ.difference(text1, text2, engine)))
+                self.assertRebuilds(text1, text2, differ.load(diff))
+
+    def testDifflibEngineMatchesOriginal(self):
+        differ = SublimergeDiffer()
+
+        for text1, text2 in randomPairs(300, 4):
+            # common ends are trimmed before diffing, which may move an
+            # ambiguous insertion, so the original diffs the same middle
+            lines1 = text1.splitlines(1)
+            lines2 = text2.splitlines(1)
+            prefix, suffix = differ.commonEnds(lines1, lines2)
+            end1 = len(lines1) - suffix
+            end2 = len(lines2) - suffix
+
+            expected = [u''.join(lines1[0:prefix])]
+            expected.extend(originalDifference(u''.join(lines1[prefix:end1]), u''.join(lines2[prefix:end2])))
+            expected.append(u''.join(lines1[end1:]))
+            expected = [part for part in joinUnchanged(expected) if part != u'']
+
+            self.assertEqual(joinUnchanged(differ.difference(text1, text2, 'difflib')), expected)
+
+
+    def testDifflibEngineReportsProgress(self):
+        for text1, text2 in randomPairs(100, 7):
+            monitor = Monitor()
+            SublimergeDiffer().hunks(text1, text2, 'difflib', monitor)
+            self.assertEqual(monitor.done, monitor.total)
+
+        lines = [u'line %d\n' % (i) for i in range(2000)]
+        text1 = u''.join(lines)
+        text2 = u''.join([i % 5 == 0 and u'changed\n' or lines[i] for i in range(2000)])
+        monitor = Monitor(100)
+
+        self.assertRaises(Cancelled, SublimergeDiffer().hunks, text1, text2, 'difflib', monitor)
+        self.assertTrue(monitor.done < 110)
+
+
+class IntralineDifferTest(unittest.TestCase):
+    def testMarksChangedWords(self):
+        offsets = SublimergeIntralineDiffer().difference(u'value = compute(a, b)\n', u'value = compute(a, c)\n')
+        self.assertEqual(offsets, {'-': [[19, 20]], '+': [[19, 20]]})
+
+    def testCostlyChangesMarkWholeLines(self):
+        rnd = random.Random(5)
+        text1 = u' '.join([rnd.choice([u'x', u'y', u'z']) for i in range(600)]) + u'\nend'
+        text2 = u' '.join([rnd.choice([u'x', u'y', u'z']) for i in range(600)]) + u'\nend'
+        differ = SublimergeIntralineDiffer()
+
+        self.assertEqual(differ.difference(text1, text2), differ.wholeLines(text1, text2))
+        self.assertTrue(differ.steps <= differ.maxSteps + 1)
+
+    def testManyTokensMarkWholeLines(self):
+        text1 = u' '.join([u'w%d' % i for i in range(1000)])
+        text2 = text1.replace(u'w500', u'changed')
+        differ = SublimergeIntralineDiffer()
+
+        self.assertEqual(differ.difference(text1, text2), differ.wholeLines(text1, text2))
+
+
+if __name__ == '__main__':
+    unittest.main()
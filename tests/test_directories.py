@@ -0,0 +1,85 @@
+# Checks SublimergeDirectoryDiffThread on directory trees made up in a
+# temporary directory: symlinks pointing back up the tree, names that are a
+# directory on one side and a file on the other, and what opening an entry
+# from the quick panel does.
+#
+# Usage: python -m unittest discover -s tests
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'benchmarks', 'stub'))
+sys.path.insert(1, root)
+
+import sublime
+from Sublimerge import SublimergeDirectoryDiffThread
+
+
+def write(path, contents, mtime):
+    f = open(path, 'wb')
+    f.write(contents)
+    f.close()
+    os.utime(path, (mtime, mtime))
+
+
+class DirectoryDiffTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.left = os.path.join(self.root, 'left')
+        self.right = os.path.join(self.root, 'right')
+
+        for side, mtime in ((self.left, 1000000000), (self.right, 1000086400)):
+            os.makedirs(os.path.join(side, 'sub'))
+            write(os.path.join(side, 'same.txt'), 'same\n', 1000000000)
+            write(os.path.join(side, 'changed.txt'), side == self.left and 'left\n' or 'rght\n', mtime)
+            write(os.path.join(side, 'sub', 'same.txt'), 'same\n', mtime)
+
+            if hasattr(os, 'symlink'):
+                os.symlink(side, os.path.join(side, 'loop'))
+                os.symlink('..', os.path.join(side, 'sub', 'up'))
+
+        os.mkdir(os.path.join(self.left, 'mixed'))
+        write(os.path.join(self.right, 'mixed'), 'file\n', 1000000000)
+        write(os.path.join(self.left, 'kind'), 'file\n', 1000000000)
+        os.mkdir(os.path.join(self.right, 'kind'))
+        os.mkdir(os.path.join(self.left, 'onlyleft'))
+
+        sublime.reset()
+        self.window = sublime.Window()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def compare(self):
+        thread = SublimergeDirectoryDiffThread(self.window, self.left, self.right)
+        thread.join(30)
+        self.assertFalse(thread.isAlive())
+
+        return thread
+
+    def testEntries(self):
+        thread = self.compare()
+
+        self.assertEqual(sorted(thread.entries), sorted([('~', 'changed.txt'), ('-', 'onlyleft'), ('d', 'mixed'), ('f', 'kind')]))
+        self.assertNotEqual(thread.labels['d'], thread.labels['~'])
+        self.assertNotEqual(thread.labels['f'], thread.labels['~'])
+
+    def testOpensFilesOnly(self):
+        thread = self.compare()
+        thread.finish()
+        items, onSelect = self.window.panels[0]
+
+        for i in range(len(thread.entries)):
+            if thread.entries[i][0] != '~':
+                onSelect(i)
+
+        opened = sorted([view.file_name() for view in self.window.views()])
+        self.assertEqual(opened, sorted([os.path.join(self.right, 'mixed'), os.path.join(self.left, 'kind')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
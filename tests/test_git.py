@@ -0,0 +1,111 @@
+# Checks SublimergeGitCatFile against a git repository made up in a
+# temporary directory: reads, missing paths, restarting a killed git and
+# stopping an idle one. Needs git on the PATH.
+#
+# Usage: python -m unittest discover -s tests
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'benchmarks', 'stub'))
+sys.path.insert(1, root)
+
+import sublime
+from Sublimerge import SublimergeGitCatFile
+
+files = {
+    'a.txt': 'first line\r\nsecond line\r\n',
+    os.path.join('dir', 'b.txt'): '\xc4\x85\xc5\xbc\nno newline'
+}
+
+
+def git(cwd, *args):
+    devnull = open(os.devnull, 'wb')
+
+    try:
+        subprocess.check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args), cwd=cwd, stdout=devnull, stderr=devnull)
+    finally:
+        devnull.close()
+
+
+class GitCatFileTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'dir'))
+
+        for path in files:
+            f = open(os.path.join(self.root, path), 'wb')
+            f.write(files[path])
+            f.close()
+
+        git(self.root, 'init', '-q')
+        git(self.root, 'add', '.')
+        git(self.root, 'commit', '-q', '-m', 'files')
+
+        sublime.reset()
+        self.catFile = SublimergeGitCatFile(self.root)
+
+    def tearDown(self):
+        self.catFile.stop()
+        shutil.rmtree(self.root)
+
+    def testReadsFiles(self):
+        for path in files:
+            self.assertEqual(self.catFile.read('HEAD', path), files[path])
+
+    def testMissingPathGivesNone(self):
+        self.assertEqual(self.catFile.read('HEAD', 'missing.txt'), None)
+        process = self.catFile.process
+
+        self.assertEqual(self.catFile.read('HEAD', 'a.txt'), files['a.txt'])
+        self.assertTrue(self.catFile.process is process)
+
+    def testRestartsKilledProcess(self):
+        self.catFile.read('HEAD', 'a.txt')
+        killed = self.catFile.process
+        killed.kill()
+        killed.wait()
+
+        self.assertEqual(self.catFile.read('HEAD', 'a.txt'), files['a.txt'])
+        self.assertTrue(self.catFile.process is not killed)
+        self.assertEqual(self.catFile.process.poll(), None)
+
+    def testStopsWhenIdle(self):
+        self.catFile.read('HEAD', 'a.txt')
+        process = self.catFile.process
+
+        # used just now, so it keeps running
+        sublime.timeouts.pop(0)()
+        self.assertTrue(self.catFile.process is process)
+
+        self.catFile.idleTimeout = 0
+        self.catFile.read('HEAD', 'a.txt')
+        sublime.timeouts.pop(0)()
+
+        self.assertEqual(self.catFile.process, None)
+        self.assertNotEqual(process.poll(), None)
+
+    def testIdleCheckDoesNotWaitForRead(self):
+        self.catFile.read('HEAD', 'a.txt')
+        self.catFile.idleTimeout = 0
+        process = self.catFile.process
+
+        # a read holds the lock, the check is tried again later
+        self.catFile.lock.acquire()
+        sublime.timeouts.pop(0)()
+        self.catFile.lock.release()
+
+        self.assertTrue(self.catFile.process is process)
+        self.assertEqual(len(sublime.timeouts), 1)
+
+        sublime.timeouts.pop(0)()
+        self.assertEqual(self.catFile.process, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Checks SublimergeProcess with python stand-ins for the VCS tools: large
+# output on both pipes, streaming through onChunk, the timeout kill and a
+# missing executable.
+#
+# Usage: python -m unittest discover -s tests
+
+import os
+import sys
+import time
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'benchmarks', 'stub'))
+sys.path.insert(1, root)
+
+import sublime
+from Sublimerge import SublimergeProcess
+
+# writes both pipes in turns, a reader draining only one of them would hang
+bothPipes = '''
+import sys
+for i in range(20000):
+    sys.stdout.write('out %06d ' % i * 10 + '\\n')
+    sys.stderr.write('err %06d ' % i * 10 + '\\n')
+sys.exit(3)
+'''
+
+
+def expected(name):
+    return ''.join(['%s %06d ' % (name, i) * 10 + '\n' for i in range(20000)])
+
+
+class ProcessTest(unittest.TestCase):
+    def setUp(self):
+        sublime.reset()
+        self.done = []
+
+    def finish(self, process):
+        process.join(30)
+        self.assertFalse(process.isAlive())
+
+        # onDone is handed to the main thread
+        sublime.timeouts.pop(0)()
+        self.assertEqual(self.done, [process])
+
+        return process
+
+    def testCollectsLargeOutput(self):
+        process = self.finish(SublimergeProcess([sys.executable, '-c', bothPipes], root, self.done.append))
+
+        self.assertEqual(process.returncode, 3)
+        self.assertEqual(process.stdout, expected('out'))
+        self.assertEqual(process.stderr, expected('err'))
+        self.assertFalse(process.timedOut)
+
+    def testStreamsChunks(self):
+        chunks = []
+        process = self.finish(SublimergeProcess([sys.executable, '-c', bothPipes], root, self.done.append, chunks.append))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), expected('out'))
+        self.assertEqual(process.stdout, '')
+        self.assertEqual(process.stderr, expected('err'))
+
+    def testKillsOnTimeout(self):
+        started = time.time()
+        process = self.finish(SublimergeProcess([sys.executable, '-c', 'import time; time.sleep(60)'], root, self.done.append, None, 0.5))
+
+        self.assertTrue(process.timedOut)
+        self.assertNotEqual(process.returncode, 0)
+        self.assertTrue(time.time() - started < 30)
+
+    def testMissingExecutable(self):
+        process = self.finish(SublimergeProcess([os.path.join(root, 'no-such-tool')], root, self.done.append))
+
+        self.assertEqual(process.returncode, None)
+        self.assertTrue(process.stderr.startswith('Could not run'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Checks SublimergeView against the stub sublime module of the benchmarks:
+# abandoning unmerged differences on save has to write what the original
+# per hunk replace loop wrote, edits typed into the comparison have to end
+# up in the saved text exactly as typed and scrolling has to be followed.
+#
+# Usage: python -m unittest discover -s tests
+
+import os
+import random
+import sys
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'benchmarks', 'stub'))
+sys.path.insert(1, root)
+
+import sublime
+from Sublimerge import S, SublimergeView
+from sublimerge_core import SublimergeDiffer
+
+words = [u'a', u'b', u'foo', u'bar', u'{', u'}', u'', u'ąż']
+
+# region key and own content key of each side
+sides = {'left': ('regionLeft', 'mergeRight'), 'right': ('regionRight', 'mergeLeft')}
+
+
+def randomText(rnd):
+    return u''.join([rnd.choice(words) + u'\n' for i in range(rnd.randint(0, 40))]) + rnd.choice([u'', u'end'])
+
+
+def originalAbandon(diffView, side):
+    # SublimergeView.abandonUnmergedDiffs as it was before the single pass
+    if side == 'left':
+        view, regionKey, contentKey = (diffView.left, 'regionLeft', 'mergeRight')
+    else:
+        view, regionKey, contentKey = (diffView.right, 'regionRight', 'mergeLeft')
+
+    edit = view.begin_edit()
+
+    for i in range(len(diffView.regions)):
+        sizeBefore = view.size()
+        view.replace(edit, diffView.hunkRegion(diffView.regions[i], regionKey), diffView.regions[i][contentKey])
+        sizeDiff = view.size() - sizeBefore
+
+        if sizeDiff != 0:
+            diffView.offsets[regionKey].add(diffView.regions[i]['slot'] + 1, sizeDiff)
+
+    view.end_edit(edit)
+
+
+def comparison(text1, text2):
+    window = sublime.Window()
+    diffView = SublimergeView(window, sublime.View(window, text1, 'left.txt'), sublime.View(window, text2, 'right.txt'), None)
+    diffView.insertDiffContents(SublimergeDiffer().hunks(text1, text2))
+
+    return diffView
+
+
+def realText(diffView, side):
+    # the text saving writes, with every hunk holding its own side's part
+    regionKey, contentKey = sides[side]
+    text = getattr(diffView, side).text
+    parts = []
+    pos = 0
+
+    for pair in diffView.regions:
+        region = diffView.hunkRegion(pair, regionKey)
+        parts.append(text[pos:region.begin()])
+        parts.append(pair[contentKey])
+        pos = region.end()
+
+    parts.append(text[pos:])
+
+    return u''.join(parts)
+
+
+def viewPosition(diffView, side, position):
+    # maps a position in the real text to the buffer, in front of padding
+    regionKey, contentKey = sides[side]
+    shift = 0
+
+    for pair in diffView.regions:
+        region = diffView.hunkRegion(pair, regionKey)
+
+        if region.begin() - shift > position:
+            break
+        elif region.begin() - shift + len(pair[contentKey]) >= position:
+            return position + shift
+
+        shift += region.size() - len(pair[contentKey])
+
+    return position + shift
+
+
+def edit(diffView, side, begin, end, characters):
+    view = getattr(diffView, side)
+    begin = viewPosition(diffView, side, begin)
+    end = viewPosition(diffView, side, end)
+
+    view.text = view.text[:begin] + characters + view.text[end:]
+    view.sel().clear()
+    view.sel().add(sublime.Region(begin + len(characters)))
+    view.history = ('insert', {'characters': characters}, 1)
+    diffView.textModified(view)
+
+
+class AbandonUnmergedDiffsTest(unittest.TestCase):
+    def testMatchesPerHunkReplace(self):
+        rnd = random.Random(4)
+
+        for i in range(300):
+            text1 = randomText(rnd)
+            text2 = randomText(rnd)
+
+            for side in ('left', 'right'):
+                expected = comparison(text1, text2)
+                actual = comparison(text1, text2)
+
+                for j in range(rnd.randint(0, 3)):
+                    if len(expected.regions) > 0:
+                        index = rnd.randint(0, len(expected.regions) - 1)
+                        direction = rnd.choice(['<<', '>>'])
+
+                        for diffView in (expected, actual):
+                            diffView.selectDiff(index)
+                            diffView.merge(direction, False)
+
+                originalAbandon(expected, side)
+                actual.abandonUnmergedDiffs(side)
+
+                saved = getattr(actual, side).text
+                self.assertEqual(saved.encode('utf-8'), getattr(expected, side).text.encode('utf-8'))
+                self.assertEqual(actual.texts[side].text(), saved)
+
+                for k in range(len(actual.regions)):
+                    for regionKey in ('regionLeft', 'regionRight'):
+                        self.assertEqual(actual.hunkRegion(actual.regions[k], regionKey), expected.hunkRegion(expected.regions[k], regionKey))
+
+
+class TextModifiedTest(unittest.TestCase):
+    def assertLayout(self, diffView):
+        left = diffView.left.text
+        right = diffView.right.text
+        posLeft = posRight = 0
+
+        for pair in diffView.regions:
+            regionLeft = diffView.hunkRegion(pair, 'regionLeft')
+            regionRight = diffView.hunkRegion(pair, 'regionRight')
+            enlarged = diffView.enlargeCorrespondingPart(pair['mergeLeft'], pair['mergeRight'])
+
+            self.assertEqual(left[posLeft:regionLeft.begin()], right[posRight:regionRight.begin()])
+            self.assertEqual(left[regionLeft.begin():regionLeft.end()], enlarged[1])
+            self.assertEqual(right[regionRight.begin():regionRight.end()], enlarged[0])
+            posLeft = regionLeft.end()
+            posRight = regionRight.end()
+
+        self.assertEqual(left[posLeft:], right[posRight:])
+
+    def testTypingAtEndKeepsMissingFinalNewline(self):
+        diffView = comparison(u'a\nb\nlast', u'a\nc\nother')
+
+        for characters in u'xyz':
+            end = len(realText(diffView, 'left'))
+            edit(diffView, 'left', end, end, characters)
+
+        self.assertEqual(diffView.left.text, u'a\nb\nlastxyz')
+        self.assertEqual([(pair['mergeRight'], pair['mergeLeft']) for pair in diffView.regions], [(u'b\nlastxyz', u'c\nother')])
+        self.assertFalse(diffView.left.is_scratch())
+        self.assertTrue(diffView.right.is_scratch())
+
+    def testEditsEndUpInRealText(self):
+        rnd = random.Random(8)
+
+        for i in range(200):
+            diffView = comparison(randomText(rnd), randomText(rnd))
+
+            for j in range(10):
+                side, other = rnd.choice([('left', 'right'), ('right', 'left')])
+                expected = realText(diffView, side)
+                otherExpected = realText(diffView, other)
+
+                begin = rnd.randint(0, len(expected))
+                end = min(len(expected), begin + rnd.randint(0, 3))
+
+                # deleting across padding is ambiguous, only insert there
+                if viewPosition(diffView, side, end) - viewPosition(diffView, side, begin) != end - begin:
+                    end = begin
+
+                characters = rnd.choice([u'', u'x', u'\n', u'foo\n', u'ąż'])
+                edit(diffView, side, begin, end, characters)
+
+                self.assertEqual(realText(diffView, side), expected[:begin] + characters + expected[end:])
+                self.assertEqual(realText(diffView, other), otherExpected)
+                self.assertLayout(diffView)
+
+
+def wrapLines(view, width):
+    # lays lines out as if word_wrap broke them every width characters
+    def tops():
+        result = [0.0]
+
+        for line in view.text.split(u'\n'):
+            result.append(result[len(result) - 1] + (len(line) // width + 1) * view.line_height())
+
+        return result
+
+    def textToLayout(point):
+        row, col = view.rowcol(point)
+        return (0.0, tops()[row])
+
+    def layoutToText(vector):
+        starts = tops()
+        row = 0
+
+        while row + 2 < len(starts) and starts[row + 1] <= vector[1]:
+            row += 1
+
+        return view.text_point(row, 0)
+
+    view.text_to_layout = textToLayout
+    view.layout_to_text = layoutToText
+
+
+class ScrollSyncTest(unittest.TestCase):
+    def setUp(self):
+        sublime.reset()
+        self.idleInterval = S.get('scroll_sync_idle_interval')
+
+    def tearDown(self):
+        S.s['scroll_sync_idle_interval'] = self.idleInterval
+
+    def poll(self, times):
+        for i in range(times):
+            sublime.timeouts.pop(0)()
+
+    def testFollowsWrappedLines(self):
+        text = u''.join([u'line %d %s\n' % (i, u'x' * (i % 3 * 30)) for i in range(60)])
+        diffView = comparison(text, text.replace(u'line 50 ', u'line fifty '))
+        wrapLines(diffView.left, 40)
+        self.poll(2)
+
+        top = diffView.left.text_to_layout(diffView.left.text_point(20, 0))[1]
+        diffView.left.set_viewport_position((0.0, top + 8.0))
+        self.poll(1)
+
+        self.assertEqual(diffView.right.viewport_position(), (0.0, 20 * 16.0 + 4.0))
+
+    def testIdlePolling(self):
+        diffView = comparison(u'a\nb\n', u'a\nc\n')
+        self.poll(diffView.scrollSync.idleTicks + 5)
+        self.assertEqual(len(sublime.timeouts), 1)
+
+        S.s['scroll_sync_idle_interval'] = 0
+        diffView.scrollSync.wake()
+        self.poll(diffView.scrollSync.idleTicks)
+
+        self.assertEqual(sublime.timeouts, [])
+        self.assertFalse(diffView.scrollSync.running)
+
+        diffView.wakeScrollSync()
+        self.assertEqual(len(sublime.timeouts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()